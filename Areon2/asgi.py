@@ -6,3 +6,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Areon2.settings')
 
 application = get_asgi_application()
+
+# Шаблоны и URL готовятся до первого запроса (production boot)
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP_ON_STARTUP:
+    from main.warmup import warm_up
+    warm_up()
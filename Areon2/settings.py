@@ -13,9 +13,21 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-z=suh-)ys(71j(t(v7&+15t-t8dl%=&)q07df4ra45npt3@1%1'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+# Production boot: шаблоны компилируются и URL-резолвер заполняется при старте
+# воркера (см. main/warmup.py), а не на первом запросе
+WARMUP_ON_STARTUP = os.environ.get('DJANGO_WARMUP', '0' if DEBUG else '1') == '1'
+
+# Post-deploy hook: при старте воркера заполнить кеш страниц популярных курсов
+# (то же, что python manage.py warm_cache)
+WARM_CACHE_ON_STARTUP = os.environ.get('DJANGO_WARM_CACHE', '0') == '1'
+
+# Цель для холодного старта воркера (импорт + прогрев + первый запрос), мс.
+# Проверка: python manage.py startup_report
+STARTUP_TARGET_MS = 1500
 
 
 # Application definition
@@ -33,6 +45,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Сжатие HTML и JSON ответов (статика сжата заранее)
+    'django.middleware.gzip.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -48,13 +62,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Скомпилированные шаблоны живут весь процесс; при DEBUG кеш
+            # сбрасывается автоперезагрузкой runserver при изменении файлов
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -73,6 +94,58 @@ DATABASES = {
 }
 
 
+# Cache
+# В продакшене подключить общий для всех воркеров кеш (Redis/Memcached)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# Sessions and auth
+# Сессия читается из кеша (БД только при промахе), пользователь - из кеша на 5 минут,
+# сообщения хранятся в cookie и не перезаписывают сессию
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+AUTHENTICATION_BACKENDS = [
+    'main.auth.CachedModelBackend',
+]
+
+
+# Progress storage
+# True - прогресс курса читается из битовой карты CourseProgress (одна строка на курс).
+# Перед включением выполнить: python manage.py build_progress_bitmaps
+
+PROGRESS_BITMAPS = False
+
+
+# Rate limiting (main/ratelimit.py)
+# область: (запросов в минуту, всплеск) - на пользователя, для анонимов - на IP
+
+RATE_LIMITS = {
+    'comment': (6, 3),
+    'complete': (30, 5),
+    'sync': (12, 3),
+    'auth': (10, 5),
+}
+
+# За обратным прокси REMOTE_ADDR - адрес прокси. Заголовок с адресом клиента
+# (например, HTTP_X_FORWARDED_FOR) и число доверенных прокси перед приложением
+RATE_LIMIT_IP_HEADER = os.environ.get('DJANGO_RATE_LIMIT_IP_HEADER') or None
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('DJANGO_RATE_LIMIT_TRUSTED_PROXIES', '1'))
+
+
+# Live updates (SSE)
+# Бэкенд рассылки событий между воркерами. LocalBackend работает только в пределах
+# одного процесса; для нескольких воркеров подключить бэкенд с общим каналом.
+
+EVENTS_BACKEND = 'main.events.LocalBackend'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -105,11 +178,6 @@ USE_TZ = True
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-STATIC_URL = '/static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-#TATICFILES_DIRS = [
-    #os.path.join(BASE_DIR, 'static'),
-#]
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'index'
 LOGOUT_REDIRECT_URL = 'index'
@@ -117,8 +185,29 @@ LOGOUT_REDIRECT_URL = 'index'
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
+# collectstatic добавляет в имена хеш содержимого и кладет рядом сжатые .gz/.br копии
 
-STATIC_URL = 'static/'
+STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'main.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+    # Файлы уроков и аватары: одинаковое содержимое хранится один раз (main/blobstore.py)
+    'blobs': {
+        'BACKEND': 'main.blobstore.BlobStorage',
+    },
+}
+
+# Обработчики загрузки считают sha256 файла по мере приема данных
+FILE_UPLOAD_HANDLERS = [
+    'main.blobstore.HashingMemoryFileUploadHandler',
+    'main.blobstore.HashingTemporaryFileUploadHandler',
+]
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
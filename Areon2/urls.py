@@ -1,8 +1,10 @@
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from main.staticfiles import serve as serve_static
+
 urlpatterns = [
     # Админ-панель
     path('admin/', admin.site.urls),
@@ -14,4 +16,9 @@ urlpatterns = [
 # Для загрузки медиа-файлов (изображения, документы) в режиме разработки
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+else:
+    # Статика после collectstatic; если ее раздает веб-сервер, сюда запросы не дойдут
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static),
+    ]
\ No newline at end of file
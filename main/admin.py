@@ -1,45 +1,113 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count
+from django.utils.functional import cached_property
 from .models import Category, Course, Lesson, Comment, Progress, UserProfile, Masage
 
 
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который для больших таблиц без фильтров берет оценку числа строк (PostgreSQL)"""
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if connection.vendor == 'postgresql' and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [self.object_list.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            # После создания таблицы (до ANALYZE) оценки нет - считаем честно
+            if row and row[0] > 0:
+                return row[0]
+        return super().count
+
+
+class FastChangeListMixin:
+    """Общие настройки списков для больших таблиц"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # без второго COUNT(*) по всей таблице
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех связанных объектов"""
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # Фильтр показывается, только если есть хоть один вариант
+        return ((),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (key, value)
+            for key, value in changelist.params.items()
+            if key != self.parameter_name
+        ]
+        yield all_choice
+
+
+class CourseNameFilter(InputFilter):
+    title = 'курсу'
+    parameter_name = 'course_name'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(course__name__icontains=self.value())
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'get_courses_count']
     search_fields = ['name']   #попробовать добавить в поиск по курсам связанным с категорией
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(courses_count=Count('courses'))
+    
     def get_courses_count(self,obj):
-        return obj.courses.count()
+        return obj.courses_count
     get_courses_count.short_description = "Количество курсов"
+    get_courses_count.admin_order_field = 'courses_count'
     
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(FastChangeListMixin, admin.ModelAdmin):
     """Админка для курсов"""
     list_display = ['name', 'author', 'category', 'created_at', 'get_lessons_count']
     list_filter = ['category', 'created_at']
+    list_select_related = ['author', 'category']
     search_fields = ['name', 'description', 'author__username']
-    date_hierarchy = 'created_at'
+    autocomplete_fields = ['author', 'category']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(lessons_count=Count('lessons'))
     
     def get_lessons_count(self, obj):
-        return obj.lessons.count()
+        return obj.lessons_count
     get_lessons_count.short_description = 'Количество уроков'  ## добавить возможность убирать категории поиска (сейчас работает по принцыпу выберу одно. А после будет по принципу выбери те что нужны)
+    get_lessons_count.admin_order_field = 'lessons_count'
 
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(FastChangeListMixin, admin.ModelAdmin):
     """Админка для уроков"""
     list_display = ['title', 'course', 'order', 'created_at'] #проверить можно ли самостоятельно менять порядок
-    list_filter = ['course', 'created_at']
+    list_filter = [CourseNameFilter, 'created_at']
+    list_select_related = ['course']
     search_fields = ['title', 'description', 'course__name',] #понять схуяли не работает добовление поиска по чему то
+    autocomplete_fields = ['course']
     ordering = ['course', 'order']
-    date_hierarchy = 'created_at'
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FastChangeListMixin, admin.ModelAdmin):
     """Админка для комментариев"""
     list_display = ['author', 'get_course', 'text_preview', 'created_at']
-    list_filter = ['created_at']
+    list_filter = [CourseNameFilter, 'created_at']
+    list_select_related = ['author', 'course']
     search_fields = ['text', 'author__username', 'course__name']
-    date_hierarchy = 'created_at'
+    autocomplete_fields = ['author', 'course']
     
     def get_course(self, obj):
         return obj.course.name
@@ -51,12 +119,13 @@ class CommentAdmin(admin.ModelAdmin):
 
 
 @admin.register(Progress)
-class ProgressAdmin(admin.ModelAdmin):
+class ProgressAdmin(FastChangeListMixin, admin.ModelAdmin):
     """Админка для прогресса"""
     list_display = ['user', 'get_course', 'lesson', 'completed', 'updated_at']
     list_filter = ['completed', 'updated_at']
+    list_select_related = ['user', 'lesson__course']
     search_fields = ['user__username', 'lesson__title', 'lesson__course__name']
-    date_hierarchy = 'updated_at'
+    autocomplete_fields = ['user', 'lesson']
     
     def get_course(self, obj):
         return obj.lesson.course.name
@@ -64,20 +133,18 @@ class ProgressAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(FastChangeListMixin, admin.ModelAdmin):
     """Админка для профилей"""
     list_display = ['user', 'created_at', 'get_courses_created']
+    list_filter = ['created_at']
+    list_select_related = ['user']
     search_fields = ['user__username', 'bio']
-    date_hierarchy = 'created_at'
+    autocomplete_fields = ['user']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(courses_created=Count('user__created_courses'))
     
     def get_courses_created(self, obj):
-        return obj.user.created_courses.count()
+        return obj.courses_created
     get_courses_created.short_description = 'Создано курсов'
-    
-    
-    
-    
-    
-    
-    
-    
+    get_courses_created.admin_order_field = 'courses_created'
@@ -0,0 +1,358 @@
+import json
+from collections import defaultdict
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import Count
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, set_response_etag
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_GET, require_POST
+
+from . import autocomplete, events, leaderboards
+from . import progress as progress_store
+from . import resources
+from .content import RENDERER_VERSION
+from .models import Course, Lesson, LessonSection, Progress
+from .ratelimit import rate_limit
+
+
+MAX_SYNC_ITEMS = 500
+MAX_SUGGESTIONS = 10
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _parse_sync_items(payload):
+    """Проверить пакет и оставить по одной (самой поздней) записи на урок"""
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        raise ValueError('Ожидается объект с полем items (список)')
+    if len(items) > MAX_SYNC_ITEMS:
+        raise ValueError(f'Не больше {MAX_SYNC_ITEMS} записей за раз')
+
+    latest = {}
+    now = timezone.now()
+    for item in items:
+        try:
+            lesson_id = int(item['lesson_id'])
+            completed = item['completed']
+            client_timestamp = parse_datetime(item['client_timestamp'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Каждая запись: lesson_id, completed, client_timestamp')
+        if not isinstance(completed, bool) or client_timestamp is None:
+            raise ValueError('Каждая запись: lesson_id, completed, client_timestamp')
+        if timezone.is_naive(client_timestamp):
+            client_timestamp = timezone.make_aware(client_timestamp)
+        # Часы клиента могут спешить: время из будущего навсегда выиграло бы
+        # все конфликты у изменений с других устройств
+        client_timestamp = min(client_timestamp, now)
+
+        if lesson_id not in latest or latest[lesson_id][1] < client_timestamp:
+            latest[lesson_id] = (completed, client_timestamp)
+    return latest
+
+
+def course_progress_summary(user, course_ids):
+    """Прогресс пользователя по курсам: {course_id: {completed, total, percent}}"""
+    totals = dict(
+        Lesson.objects.filter(course_id__in=course_ids)
+        .values_list('course_id').annotate(n=Count('id')).order_by()
+    )
+    completed = progress_store.completed_counts(user)
+
+    summary = {}
+    for course_id in course_ids:
+        total = totals.get(course_id, 0)
+        done = completed.get(course_id, 0)
+        summary[course_id] = {
+            'completed': done,
+            'total': total,
+            'percent': int((done / total) * 100) if total > 0 else 0,
+        }
+    return summary
+
+
+@require_POST
+@rate_limit('sync')
+def progress_sync(request):
+    """Пакетная синхронизация завершения уроков (офлайн/мобильные клиенты)
+
+    Тело: {"items": [{"lesson_id": 1, "completed": true, "client_timestamp": "2025-01-01T10:00:00Z"}]}
+    Запись применяется, только если она новее состояния на сервере.
+    """
+    if not request.user.is_authenticated:
+        return _error('Требуется авторизация', status=401)
+
+    try:
+        items = _parse_sync_items(json.loads(request.body))
+    except (ValueError, UnicodeDecodeError) as e:
+        return _error(str(e))
+
+    lesson_courses = {}
+    lesson_slots = {}
+    for lesson_id, course_id, slot in Lesson.objects.filter(id__in=items).values_list('id', 'course_id', 'slot'):
+        lesson_courses[lesson_id] = course_id
+        lesson_slots[lesson_id] = slot
+    rejected = sorted(set(items) - set(lesson_courses))
+
+    with transaction.atomic():
+        for course_id in set(lesson_courses.values()):
+            progress_store.thaw(request.user, course_id)
+
+        existing = {
+            lesson_id: (completed, changed_at)
+            for lesson_id, completed, changed_at in Progress.objects
+            .select_for_update()
+            .filter(user=request.user, lesson_id__in=lesson_courses)
+            .values_list('lesson_id', 'completed', 'changed_at')
+        }
+
+        to_write = []
+        skipped = []
+        deltas = defaultdict(int)
+        for lesson_id, (completed, client_timestamp) in items.items():
+            if lesson_id not in lesson_courses:
+                continue
+
+            current, changed_at = existing.get(lesson_id, (False, None))
+            # Конфликт: на сервере более свежее изменение - побеждает сервер.
+            # Сравниваются времена событий, а не время записи: синхронизация
+            # может прийти позже более нового изменения с другого устройства
+            if changed_at is not None and changed_at >= client_timestamp:
+                skipped.append(lesson_id)
+                continue
+            if lesson_id in existing and current == completed:
+                continue
+
+            to_write.append(Progress(
+                user=request.user, lesson_id=lesson_id, completed=completed, changed_at=client_timestamp
+            ))
+            if current != completed:
+                deltas[lesson_courses[lesson_id]] += 1 if completed else -1
+
+        Progress.objects.bulk_create(
+            to_write,
+            update_conflicts=True,
+            unique_fields=['user', 'lesson'],
+            update_fields=['completed', 'updated_at', 'changed_at']
+        )
+        progress_store.update_bitmaps(request.user, [
+            (lesson_courses[p.lesson_id], lesson_slots[p.lesson_id], p.completed)
+            for p in to_write
+        ])
+        leaderboards.apply_deltas(request.user, deltas)
+
+    summary = course_progress_summary(request.user, set(lesson_courses.values()))
+
+    changed = defaultdict(dict)
+    for p in to_write:
+        changed[lesson_courses[p.lesson_id]][p.lesson_id] = p.completed
+    for course_id, lessons in changed.items():
+        events.publish_progress(request.user, course_id, lessons, summary[course_id]['completed'])
+
+    return JsonResponse({
+        'applied': [p.lesson_id for p in to_write],
+        'skipped': sorted(skipped),
+        'rejected': rejected,
+        'courses': {str(course_id): data for course_id, data in summary.items()},
+    })
+
+
+@require_GET
+@cache_control(public=True, max_age=60)
+def suggest(request):
+    """Подсказки для поиска по мере ввода: ?q=префикс&limit=N
+
+    Отвечает из индекса в памяти (main/autocomplete.py), без запросов к БД.
+    """
+    try:
+        limit = max(1, min(int(request.GET.get('limit', MAX_SUGGESTIONS)), MAX_SUGGESTIONS))
+    except ValueError:
+        return _error('limit должен быть числом')
+
+    suggestions = autocomplete.suggest(request.GET.get('q', ''), limit)
+    return JsonResponse({
+        'suggestions': [
+            {
+                'type': s.kind,
+                'id': s.id,
+                'title': s.title,
+                'url': reverse('course_detail' if s.kind == 'course' else 'lesson_detail', args=[s.id]),
+            }
+            for s in suggestions
+        ]
+    })
+
+
+# --- JSON API только для чтения ---
+# Общие параметры: fields=a,b (поля ресурса), fields[<вложенный>]=..., include=...,
+# limit и cursor (для списков). Ответ с ETag: повторный запрос с If-None-Match -> 304.
+
+
+def _read_api(view):
+    """Ошибки параметров -> 400, отсутствующий объект -> 404 (в JSON)"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ValueError as e:
+            return _error(str(e))
+        except Http404:
+            return _error('Не найдено', status=404)
+
+    return require_GET(wrapper)
+
+
+def _cached_json(request, data, private=False):
+    response = JsonResponse(data)
+    set_response_etag(response)
+    response = get_conditional_response(request, etag=response['ETag'], response=response)
+    # Клиент всегда перепроверяет ответ, но при совпадении ETag тело не передается
+    if private:
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def _page(data, cursor):
+    return {'data': data, 'next_cursor': cursor}
+
+
+@_read_api
+def api_courses(request):
+    """Список курсов: ?category=, include=author,lessons"""
+    fields = resources.parse_fields(request, 'fields', resources.COURSE_FIELDS, resources.DEFAULT_COURSE_FIELDS)
+    lesson_fields = resources.parse_fields(request, 'fields[lessons]', resources.LESSON_FIELDS, resources.DEFAULT_LESSON_FIELDS)
+    include = resources.parse_include(request, {'author', 'lessons'})
+
+    courses = resources.course_queryset(fields, include, lesson_fields)
+    category = request.GET.get('category')
+    if category:
+        if not category.isdigit():
+            raise ValueError('category должен быть числом')
+        courses = courses.filter(category_id=category)
+
+    courses, cursor = resources.paginate(request, courses, 'created_at', descending=True)
+    return _cached_json(request, _page(
+        [resources.serialize_course(course, fields, include, lesson_fields) for course in courses],
+        cursor
+    ))
+
+
+@_read_api
+def api_course(request, course_id):
+    """Курс: include=author,lessons"""
+    fields = resources.parse_fields(request, 'fields', resources.COURSE_FIELDS, resources.DEFAULT_COURSE_FIELDS)
+    lesson_fields = resources.parse_fields(request, 'fields[lessons]', resources.LESSON_FIELDS, resources.DEFAULT_LESSON_FIELDS)
+    include = resources.parse_include(request, {'author', 'lessons'})
+
+    course = get_object_or_404(resources.course_queryset(fields, include, lesson_fields), id=course_id)
+    return _cached_json(request, {'data': resources.serialize_course(course, fields, include, lesson_fields)})
+
+
+@_read_api
+def api_course_lessons(request, course_id):
+    """Оглавление курса (без содержимого уроков)"""
+    fields = resources.parse_fields(request, 'fields', resources.LESSON_FIELDS, resources.DEFAULT_LESSON_FIELDS)
+    get_object_or_404(Course.objects.only('id'), id=course_id)
+
+    lessons, cursor = resources.paginate(
+        request, resources.lesson_queryset(fields).filter(course_id=course_id), 'order'
+    )
+    return _cached_json(request, _page(
+        [resources.serialize(lesson, resources.LESSON_FIELDS, fields) for lesson in lessons],
+        cursor
+    ))
+
+
+@_read_api
+def api_lesson(request, lesson_id):
+    """Урок без содержимого"""
+    fields = resources.parse_fields(request, 'fields', resources.LESSON_FIELDS, resources.DEFAULT_LESSON_FIELDS)
+    lesson = get_object_or_404(resources.lesson_queryset(fields), id=lesson_id)
+    return _cached_json(request, {'data': resources.serialize(lesson, resources.LESSON_FIELDS, fields)})
+
+
+def _content_etag(request, lesson_id):
+    content = Lesson.objects.filter(id=lesson_id).values_list('content_hash', flat=True).first()
+    return f'{content}-{RENDERER_VERSION}' if content else None
+
+
+@require_GET
+@cache_control(public=True, no_cache=True)
+@etag(_content_etag)
+def api_lesson_content(request, lesson_id):
+    """Содержимое урока: HTML и оглавление разделов"""
+    lesson = (
+        Lesson.objects.only('id', 'content', 'content_html', 'content_hash', 'renderer_version')
+        .filter(id=lesson_id)
+        .first()
+    )
+    if lesson is None:
+        return _error('Не найдено', status=404)
+    html = lesson.rendered_content
+    sections = LessonSection.objects.filter(lesson=lesson).order_by('position').values_list('position', 'title')
+    return JsonResponse({'data': {
+        'id': lesson.id,
+        'html': html,
+        'sections': [
+            {
+                'position': position,
+                'title': title,
+                'url': reverse('lesson_section', args=[lesson.id, position]),
+            }
+            for position, title in sections
+        ],
+    }})
+
+
+@_read_api
+def api_course_comments(request, course_id):
+    """Комментарии курса, новые первыми: include=author"""
+    fields = resources.parse_fields(request, 'fields', resources.COMMENT_FIELDS, resources.DEFAULT_COMMENT_FIELDS)
+    include = resources.parse_include(request, {'author'})
+    get_object_or_404(Course.objects.only('id'), id=course_id)
+
+    comments, cursor = resources.paginate(
+        request,
+        resources.comment_queryset(fields, include).filter(course_id=course_id),
+        'created_at',
+        descending=True
+    )
+    return _cached_json(request, _page(
+        [resources.serialize_comment(comment, fields, include) for comment in comments],
+        cursor
+    ))
+
+
+@_read_api
+def api_progress(request):
+    """Прогресс текущего пользователя по курсам; ?course=<id> - еще и id пройденных уроков"""
+    if not request.user.is_authenticated:
+        return _error('Требуется авторизация', status=401)
+
+    course_id = request.GET.get('course')
+    if course_id:
+        if not course_id.isdigit():
+            raise ValueError('course должен быть числом')
+        course = get_object_or_404(Course.objects.only('id'), id=course_id)
+        summary = course_progress_summary(request.user, [course.id])
+        data = dict(summary[course.id], course=course.id)
+        data['completed_lessons'] = sorted(progress_store.completed_lesson_ids(request.user, course))
+        return _cached_json(request, {'data': data}, private=True)
+
+    course_ids = sorted(progress_store.completed_counts(request.user))
+    summary = course_progress_summary(request.user, course_ids)
+    return _cached_json(request, {
+        'data': [dict(summary[course_id], course=course_id) for course_id in course_ids]
+    }, private=True)
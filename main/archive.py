@@ -0,0 +1,80 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from . import bitmaps
+from .models import Lesson, Progress, ProgressArchive
+
+
+# Архивация холодного прогресса: строки Progress неактивных пользователей и
+# давно пройденных курсов сворачиваются в одну битовую карту на (пользователь, курс)
+
+DEFAULT_INACTIVE_DAYS = 180
+
+
+def cold_pairs(inactive_days=DEFAULT_INACTIVE_DAYS):
+    """Пары (user_id, course_id, начало, последняя активность) для архивации"""
+    cutoff = timezone.now() - timedelta(days=inactive_days)
+
+    active_users = set(
+        Progress.objects.filter(updated_at__gte=cutoff).values_list('user_id', flat=True).distinct()
+    )
+    totals = dict(
+        Lesson.objects.values_list('course_id').annotate(n=Count('id')).order_by()
+    )
+
+    pairs = (
+        Progress.objects
+        .values_list('user_id', 'lesson__course_id')
+        .annotate(
+            first=Min('started_at'),
+            last=Max('updated_at'),
+            done=Count('id', filter=Q(completed=True))
+        )
+        .filter(last__lt=cutoff)
+        .order_by()
+    )
+
+    for user_id, course_id, first, last, done in pairs.iterator(chunk_size=2000):
+        finished = done >= totals.get(course_id, 0) > 0
+        if user_id not in active_users or finished:
+            yield user_id, course_id, first, last
+
+
+def archive_pair(user_id, course_id, first, last):
+    """Свернуть прогресс пользователя по курсу в архив. Возвращает число удаленных строк"""
+    with transaction.atomic():
+        rows = Progress.objects.filter(user_id=user_id, lesson__course_id=course_id)
+        slots = (
+            rows.filter(completed=True)
+            .values_list('lesson__slot', flat=True)
+        )
+        bitmap = bitmaps.from_slots(slots)
+
+        archive, created = ProgressArchive.objects.select_for_update().get_or_create(
+            user_id=user_id,
+            course_id=course_id,
+            defaults={'started_at': first, 'last_activity': last}
+        )
+        if not created:
+            bitmap = bitmaps.union(archive.completed_slots, bitmap)
+            archive.started_at = min(archive.started_at, first)
+            archive.last_activity = max(archive.last_activity, last)
+        archive.completed_slots = bitmap
+        archive.completed_count = bitmaps.popcount(bitmap)
+        archive.save()
+
+        return rows.delete()[0]
+
+
+def archive_cold_progress(inactive_days=DEFAULT_INACTIVE_DAYS, limit=None):
+    """Архивировать холодный прогресс. Возвращает (пар, удалено строк Progress)"""
+    # Список пар читается заранее: удалять строки при открытом курсоре по той же таблице нельзя
+    pairs = list(islice(cold_pairs(inactive_days), limit))
+    deleted = 0
+    for user_id, course_id, first, last in pairs:
+        deleted += archive_pair(user_id, course_id, first, last)
+    return len(pairs), deleted
@@ -0,0 +1,28 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+# Пользователь для сессии берется из кеша, а не из БД на каждый запрос
+USER_CACHE_TIMEOUT = 300
+
+
+def user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, кеширующий пользователя на USER_CACHE_TIMEOUT секунд"""
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,297 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count
+
+from .models import Course, Lesson, Progress
+
+
+# Подсказки поиска держим в памяти процесса: отсортированный список ключей
+# (название и его окончания, начиная с каждого слова) и готовые топы для
+# частых префиксов. Запрос к подсказкам не обращается к БД.
+# Изменения названий пишутся в общий кеш под номером версии: остальные воркеры
+# применяют их к своей копии, а при пропуске в журнале перестраивают индекс
+# в фоне, продолжая отвечать по старому.
+VERSION_KEY = 'autocomplete_index_version'
+CHANGE_KEY = 'autocomplete_change_%d'
+
+MAX_TITLES = 20000      # сколько самых популярных названий держать в индексе
+MAX_WORDS = 8           # ключей на одно название (по словам)
+KEY_LENGTH = 40         # длина ключа в символах
+SCAN_LIMIT = 300        # для префиксов с большим числом ключей - заранее посчитанный топ
+TOP_LIMIT = 20
+CHANGE_TIMEOUT = 3600   # сколько хранится журнал изменений
+MAX_REPLAY = 500        # отставание больше - индекс перестраивается
+
+Suggestion = namedtuple('Suggestion', ['kind', 'id', 'title', 'course_id', 'popularity'])
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD.findall((text or '').casefold().replace('ё', 'е')))
+
+
+def _keys(title):
+    words = normalize(title).split(' ')[:MAX_WORDS]
+    return {' '.join(words[i:])[:KEY_LENGTH] for i in range(len(words)) if words[i]}
+
+
+def _rank(suggestion):
+    """Порядок выдачи: чем меньше, тем выше"""
+    return (-suggestion.popularity, suggestion.title, suggestion.kind, suggestion.id)
+
+
+def _prefix_end(prefix):
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class PrefixIndex:
+    """Индекс подсказок. Изменения не перестраивают его: списки заменяются
+    исправленными копиями, поэтому поиск без блокировки видит целое состояние"""
+
+    def __init__(self, suggestions, version):
+        self.version = version
+        chosen = sorted(suggestions, key=_rank)[:MAX_TITLES]
+        self.by_id = {(s.kind, s.id): s for s in chosen}
+        # Элементы - (ключ, ранг названия), отсортированы по ключу
+        self.entries = sorted(
+            (key, _rank(suggestion))
+            for suggestion in chosen
+            for key in _keys(suggestion.title)
+        )
+        self.top = self._frequent_prefixes()
+
+    @staticmethod
+    def _range(entries, prefix, lo=0):
+        start = bisect_left(entries, (prefix,), lo)
+        end = bisect_left(entries, (_prefix_end(prefix),), start)
+        return start, end
+
+    @staticmethod
+    def _best(entries, start, end, limit):
+        return heapq.nsmallest(limit, {rank for key, rank in entries[start:end]})
+
+    def _frequent_prefixes(self):
+        """Топы для префиксов, под которые попадает больше SCAN_LIMIT ключей"""
+        entries = self.entries
+        top = {}
+        stack = [(0, len(entries), 1)]
+        while stack:
+            lo, hi, length = stack.pop()
+            position = lo
+            while position < hi:
+                prefix = entries[position][0][:length]
+                if len(prefix) < length:
+                    # Ключ короче префикса - он уже учтен в топе родителя
+                    position += 1
+                    continue
+                start, end = self._range(entries, prefix, position)
+                if end - start > SCAN_LIMIT:
+                    top[prefix] = tuple(self._best(entries, start, end, TOP_LIMIT))
+                    stack.append((start, end, length + 1))
+                position = end
+        return top
+
+    def search(self, query, limit=10):
+        prefix = normalize(query)[:KEY_LENGTH]
+        limit = min(limit, TOP_LIMIT)
+        if not prefix:
+            return []
+
+        top, by_id = self.top, self.by_id
+        if prefix in top:
+            ranks = top[prefix][:limit]
+        else:
+            entries = self.entries
+            ranks = self._best(entries, *self._range(entries, prefix), limit)
+        found = (by_id.get(rank[2:]) for rank in ranks)
+        return [suggestion for suggestion in found if suggestion is not None]
+
+    def find(self, kind, object_id):
+        return self.by_id.get((kind, object_id))
+
+    def apply(self, kind, object_id, title, course_id, version):
+        """Заменить название (title=None - удалить; для курса - вместе с уроками)"""
+        old = self.find(kind, object_id)
+        removed = [old] if old else []
+        if kind == 'course' and title is None:
+            removed += [s for s in self.by_id.values() if s.kind == 'lesson' and s.course_id == object_id]
+        # Популярность не пересчитываем - берем из текущего индекса
+        added = [] if title is None else [
+            Suggestion(kind, object_id, title, course_id, old.popularity if old else 0)
+        ]
+
+        gone = {(key, _rank(s)) for s in removed for key in _keys(s.title)}
+        entries = [entry for entry in self.entries if entry not in gone] if gone else list(self.entries)
+        by_id = dict(self.by_id)
+        for suggestion in removed:
+            del by_id[suggestion.kind, suggestion.id]
+        for suggestion in added:
+            by_id[kind, object_id] = suggestion
+            rank = _rank(suggestion)
+            for key in _keys(suggestion.title):
+                insort(entries, (key, rank))
+
+        self.entries, self.by_id = entries, by_id
+        self.top = self._update_top(entries, {rank for key, rank in gone}, added)
+        self.version = version
+
+    def _update_top(self, entries, gone, added):
+        """Поправить только топы префиксов, которых коснулось изменение"""
+        top = dict(self.top)
+        for prefix, ranks in self.top.items():
+            if gone.intersection(ranks):
+                start, end = self._range(entries, prefix)
+                top[prefix] = tuple(self._best(entries, start, end, TOP_LIMIT))
+        for suggestion in added:
+            rank = _rank(suggestion)
+            for key in _keys(suggestion.title):
+                for length in range(1, len(key) + 1):
+                    ranks = top.get(key[:length])
+                    if ranks is not None and rank not in ranks:
+                        top[key[:length]] = tuple(heapq.nsmallest(TOP_LIMIT, ranks + (rank,)))
+        return top
+
+
+def load_suggestions():
+    course_learners = dict(
+        Progress.objects.filter(completed=True)
+        .values_list('lesson__course_id')
+        .annotate(n=Count('user_id', distinct=True))
+        .order_by()
+    )
+    lesson_completions = dict(
+        Progress.objects.filter(completed=True)
+        .values_list('lesson_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+
+    suggestions = [
+        Suggestion('course', course_id, name, course_id, course_learners.get(course_id, 0))
+        for course_id, name in Course.objects.values_list('id', 'name').iterator()
+    ]
+    suggestions += [
+        Suggestion('lesson', lesson_id, title, course_id, lesson_completions.get(lesson_id, 0))
+        for lesson_id, title, course_id in Lesson.objects.filter(course__deleted_at__isnull=True)
+        .values_list('id', 'title', 'course_id').iterator()
+    ]
+    return suggestions
+
+
+_index = None
+_lock = threading.Lock()
+_refreshing = False
+
+
+def _current_version():
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def _replay(index, version):
+    """Применить к индексу изменения из журнала. False - журнал неполон"""
+    numbers = range(index.version + 1, version + 1)
+    if len(numbers) > MAX_REPLAY:
+        return False
+    changes = cache.get_many([CHANGE_KEY % number for number in numbers])
+    if len(changes) != len(numbers):
+        return False
+    for number in numbers:
+        kind, object_id, title, course_id = changes[CHANGE_KEY % number]
+        index.apply(kind, object_id, title, course_id, number)
+    return True
+
+
+def _rebuild():
+    """Перестроить индекс из БД (в фоновом потоке)"""
+    global _index, _refreshing
+    try:
+        # Версия берется до чтения БД: изменения после нее догонит журнал
+        version = _current_version()
+        index = PrefixIndex(load_suggestions(), version)
+        with _lock:
+            if _index is None or _index.version <= version:
+                _index = index
+    finally:
+        _refreshing = False
+        # У потока свое соединение с БД
+        connections.close_all()
+
+
+def _refresh_in_background():
+    global _refreshing
+    if _refreshing:
+        return
+    _refreshing = True
+    threading.Thread(target=_rebuild, daemon=True).start()
+
+
+def build():
+    """Построить индекс сразу (прогрев воркера). Возвращает число названий"""
+    global _index
+    index = PrefixIndex(load_suggestions(), _current_version())
+    with _lock:
+        _index = index
+    return len(index.by_id)
+
+
+def get_index():
+    """Индекс подсказок. Отставший индекс догоняет журнал изменений,
+    а если это невозможно - отвечает по старому, пока в фоне строится новый"""
+    global _index
+    version = _current_version()
+    index = _index
+    if index is None:
+        # Воркер не прогрет - первый запрос строит индекс сам
+        with _lock:
+            if _index is None:
+                _index = PrefixIndex(load_suggestions(), version)
+            return _index
+    if index.version < version:
+        with _lock:
+            if index.version < version and not _replay(index, version):
+                _refresh_in_background()
+    return index
+
+
+def suggest(query, limit=10):
+    return get_index().search(query, limit)
+
+
+def _bump_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
+        return 1
+
+
+def update(kind, object_id, title=None, course_id=None):
+    """Обновить название в индексе (title=None - удалить)
+
+    Свой воркер правит индекс на месте, остальные применят изменение
+    из журнала при следующем обращении. Запросов к БД нет.
+    """
+    with _lock:
+        index = _index
+        if index is not None and title is not None:
+            old = index.find(kind, object_id)
+            if old and old.title == title and old.course_id == course_id:
+                return
+        version = _bump_version()
+        cache.set(CHANGE_KEY % version, (kind, object_id, title, course_id), CHANGE_TIMEOUT)
+        if index is not None and not _replay(index, version):
+            _refresh_in_background()
+
+
+def invalidate():
+    """Перестроить индекс во всех воркерах: пропуск в журнале заставит их перечитать БД"""
+    with _lock:
+        _bump_version()
+    _refresh_in_background()
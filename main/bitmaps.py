@@ -0,0 +1,58 @@
+# Битовые карты завершенных уроков: бит N соответствует уроку со slot = N.
+# Хранятся как bytes (little-endian), чтобы лечь в BinaryField.
+
+
+def to_int(bitmap):
+    return int.from_bytes(bytes(bitmap or b''), 'little')
+
+
+def from_int(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def from_slots(slots):
+    value = 0
+    for slot in slots:
+        value |= 1 << slot
+    return from_int(value)
+
+
+def to_slots(bitmap):
+    """Номера установленных битов"""
+    value = to_int(bitmap)
+    slots = []
+    slot = 0
+    while value:
+        if value & 1:
+            slots.append(slot)
+        value >>= 1
+        slot += 1
+    return slots
+
+
+def has(bitmap, slot):
+    return bool(to_int(bitmap) >> slot & 1)
+
+
+def set_slot(bitmap, slot, value=True):
+    bits = to_int(bitmap)
+    if value:
+        bits |= 1 << slot
+    else:
+        bits &= ~(1 << slot)
+    return from_int(bits)
+
+
+def union(*bitmaps):
+    value = 0
+    for bitmap in bitmaps:
+        value |= to_int(bitmap)
+    return from_int(value)
+
+
+def popcount(bitmap, mask=None):
+    """Число установленных битов (с mask - только среди битов маски)"""
+    value = to_int(bitmap)
+    if mask is not None:
+        value &= to_int(mask)
+    return bin(value).count('1')
@@ -0,0 +1,284 @@
+import hashlib
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+# Контентно-адресуемое хранилище файлов уроков и аватаров. Каждое уникальное
+# содержимое лежит на диске один раз: blobs/<2 символа>/<sha256>/<имя первой загрузки>.
+# Хеш считается обработчиком загрузки по мере приема данных, поэтому повторная
+# загрузка того же файла не пишет на диск ничего. Строки Blob считают ссылки
+# из Lesson.file и UserProfile.avatar; блобы без ссылок удаляет gc_blobs.
+
+BLOB_PREFIX = 'blobs/'
+CHUNK_SIZE = 64 * 1024
+DEFAULT_GRACE_HOURS = 24
+
+
+def blob_storage():
+    return storages['blobs']
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def blob_name(digest, filename):
+    return f'{BLOB_PREFIX}{digest[:2]}/{digest}/{os.path.basename(filename)}'
+
+
+def file_digest(content):
+    """sha256 содержимого файла (для файлов, пришедших не через обработчик загрузки)"""
+    sha256 = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class HashingUploadMixin:
+    """Считает sha256 загружаемого файла по частям, пока они приходят"""
+
+    def new_file(self, *args, **kwargs):
+        # До super(): обработчик в памяти прерывает цепочку исключением
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+class BlobStorage(FileSystemStorage):
+    """Файл сохраняется под хешем содержимого; путь из upload_to не используется"""
+
+    def get_available_name(self, name, max_length=None):
+        # Из имени загрузки берется только имя файла - суффиксы от совпадений не нужны
+        if not is_blob(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        digest = getattr(content, 'sha256', None) or file_digest(content)
+        blob = Blob.objects.filter(digest=digest).first()
+        if blob and self.exists(blob.name):
+            # Такое содержимое уже есть - ничего не пишем. Если строку тем временем
+            # удалил сборщик мусора, файл тоже будет удален - записываем заново
+            if Blob.objects.filter(pk=blob.pk).update(last_used=timezone.now()):
+                return blob.name
+
+        content.seek(0)
+        stored = super()._save(blob_name(digest, name), content)
+        try:
+            with transaction.atomic():
+                blob, created = Blob.objects.get_or_create(
+                    digest=digest,
+                    defaults={'name': stored, 'size': content.size}
+                )
+        except IntegrityError:
+            blob, created = Blob.objects.get(digest=digest), False
+
+        if not created and blob.name != stored:
+            if self.exists(blob.name):
+                # Тот же файл параллельно загрузил другой запрос - оставляем его копию
+                super().delete(stored)
+                return blob.name
+            # Файл блоба пропал с диска - строка указывает на новую копию
+            Blob.objects.filter(pk=blob.pk).update(name=stored, last_used=timezone.now())
+        return stored
+
+
+def _change(names, delta):
+    """Изменить счетчики одним запросом: ref_count + CASE name WHEN ... END"""
+    from .models import Blob
+
+    counts = Counter(name for name in names if is_blob(name))
+    if not counts:
+        return
+    Blob.objects.filter(name__in=counts).update(
+        ref_count=Greatest(
+            F('ref_count') + Case(
+                *[When(name=name, then=Value(delta * n)) for name, n in counts.items()],
+                output_field=IntegerField()
+            ),
+            0
+        ),
+        last_used=timezone.now()
+    )
+
+
+def acquire(names):
+    """Учесть новые ссылки на блобы"""
+    _change(names, 1)
+
+
+def release(names):
+    """Снять ссылки; блоб без ссылок удалит сборщик мусора"""
+    _change(names, -1)
+
+
+def _current(instance, field):
+    value = instance.__dict__.get(field)
+    return getattr(value, 'name', value) or ''
+
+
+def remember(instance, *fields):
+    """Запомнить имена файлов, с которыми объект загружен"""
+    instance._blob_names = {
+        field: _current(instance, field) for field in fields if field in instance.__dict__
+    }
+
+
+def remembered(instance, field):
+    return getattr(instance, '_blob_names', {}).get(field, '')
+
+
+def sync(instance, created, *fields):
+    """После сохранения: ссылка на новый файл учитывается, со старого - снимается"""
+    previous = {} if created else getattr(instance, '_blob_names', {})
+    for field in fields:
+        if field not in instance.__dict__:
+            # Поле не загружалось (defer/only) и не сохранялось
+            continue
+        old, new = previous.get(field, ''), _current(instance, field)
+        if old != new:
+            acquire([new])
+            release([old])
+    remember(instance, *fields)
+
+
+def references():
+    """Число ссылок на каждый блоб по строкам моделей"""
+    from .models import Lesson, UserProfile
+
+    counts = Counter(Lesson.all_objects.filter(file__startswith=BLOB_PREFIX).values_list('file', flat=True))
+    counts.update(UserProfile.objects.filter(avatar__startswith=BLOB_PREFIX).values_list('avatar', flat=True))
+    return counts
+
+
+def recount(dry_run=False):
+    """Пересчитать ref_count по строкам (удаления в обход сигналов).
+    Возвращает число исправленных (при dry_run - число неверных, без записи)"""
+    from .models import Blob
+
+    counts = references()
+    fixed = 0
+    for pk, name, ref_count in Blob.objects.values_list('pk', 'name', 'ref_count').iterator():
+        if counts.get(name, 0) != ref_count:
+            if not dry_run:
+                Blob.objects.filter(pk=pk).update(ref_count=counts.get(name, 0))
+            fixed += 1
+    return fixed
+
+
+def _delete_file(storage, name):
+    storage.delete(name)
+    _remove_empty_dirs(storage.path(name))
+
+
+def _remove_empty_dirs(path):
+    """Удалить опустевшие каталоги блоба: <sha256>/ и <2 символа>/"""
+    directory = os.path.dirname(path)
+    for _ in range(2):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
+
+
+def collect(grace_hours=DEFAULT_GRACE_HOURS, dry_run=False):
+    """Удалить блобы без ссылок старше grace_hours и файлы без строк Blob.
+    Возвращает (число файлов, байт)"""
+    from .models import Blob
+
+    storage = blob_storage()
+    cutoff = timezone.now() - timedelta(hours=grace_hours)
+    removed, freed = 0, 0
+
+    # Недавние блобы без ссылок не трогаем: строка урока или профиля
+    # с только что загруженным файлом может быть еще не сохранена
+    unused = Blob.objects.filter(last_used__lt=cutoff)
+    if dry_run:
+        # Счетчики при пробном запуске не исправлялись - ссылки считаются по строкам
+        unused = unused.exclude(name__in=list(references()))
+    else:
+        unused = unused.filter(ref_count=0)
+    for pk, name, size in unused.values_list('pk', 'name', 'size'):
+        if not dry_run:
+            with transaction.atomic():
+                if not Blob.objects.filter(pk=pk, ref_count=0, last_used__lt=cutoff).delete()[0]:
+                    continue
+                # Файл - только после фиксации удаления строки
+                transaction.on_commit(lambda name=name: _delete_file(storage, name))
+        removed += 1
+        freed += size
+
+    # Файлы, для которых строка не создалась (процесс упал между записью и вставкой)
+    known = set(Blob.objects.values_list('name', flat=True))
+    root = storage.path(BLOB_PREFIX)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = BLOB_PREFIX + os.path.relpath(path, root).replace(os.sep, '/')
+            modified = datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc)
+            if name in known or modified >= cutoff:
+                continue
+            size = os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+                _remove_empty_dirs(path)
+            removed += 1
+            freed += size
+    return removed, freed
+
+
+def adopt_legacy(dry_run=False):
+    """Перенести файлы, загруженные до хранилища блобов, в блобы. Возвращает число файлов"""
+    from .models import Lesson, UserProfile
+
+    storage = blob_storage()
+    moved = 0
+    for manager, field in ((Lesson.all_objects, 'file'), (UserProfile.objects, 'avatar')):
+        names = set(
+            manager.exclude(**{f'{field}__startswith': BLOB_PREFIX})
+            .exclude(**{f'{field}__isnull': True})
+            .exclude(**{field: ''})
+            .values_list(field, flat=True)
+        )
+        for name in sorted(names):
+            if not storage.exists(name):
+                continue
+            moved += 1
+            if dry_run:
+                continue
+            with storage.open(name) as source:
+                blob = storage.save(name, source)
+            with transaction.atomic():
+                # Один старый файл может быть у нескольких строк
+                acquire([blob] * manager.filter(**{field: name}).update(**{field: blob}))
+            storage.delete(name)
+    return moved
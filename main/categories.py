@@ -0,0 +1,59 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.core.cache import cache
+
+from .models import Category
+
+
+# Категории почти не меняются, поэтому держим их в памяти процесса.
+# Воркеры сверяют свою копию с номером версии в общем кеше.
+VERSION_KEY = 'category_registry_version'
+
+CategoryItem = namedtuple('CategoryItem', ['id', 'name'])
+
+
+class CategoryRegistry:
+    """Неизменяемый снимок категорий: id -> название и упорядоченный список"""
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.ordered = tuple(CategoryItem(id, name) for id, name in rows)
+        self.names = MappingProxyType({item.id: item.name for item in self.ordered})
+
+    def __contains__(self, category_id):
+        return category_id in self.names
+
+    def __iter__(self):
+        return iter(self.ordered)
+
+    def name(self, category_id):
+        return self.names.get(category_id, '')
+
+
+_registry = None
+
+
+def _current_version():
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def get_registry():
+    """Реестр категорий (из БД загружается только при смене версии)"""
+    global _registry
+    version = _current_version()
+    if _registry is None or _registry.version != version:
+        rows = Category.objects.order_by('name').values_list('id', 'name')
+        _registry = CategoryRegistry(rows, version)
+    return _registry
+
+
+def invalidate():
+    """Сбросить реестр во всех воркерах"""
+    global _registry
+    _registry = None
+    _current_version()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
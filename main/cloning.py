@@ -0,0 +1,59 @@
+from django.db import transaction
+
+from . import autocomplete, blobstore
+from .models import Course, Lesson, LessonSection
+
+
+# Копирование курса целиком: курс, уроки (с готовым HTML и слотами) и разделы
+# вставляются пачками, поэтому число запросов не зависит от числа уроков.
+# Рендер уроков не повторяется: сохраняются уже отрендеренные поля.
+
+LESSON_FIELDS = [
+    'title', 'description', 'content', 'content_html', 'content_hash',
+    'renderer_version', 'order', 'slot', 'file',
+]
+
+
+def share_file(name):
+    """Файл для копии урока: тот же блоб хранилища, байты не копируются"""
+    if not blobstore.is_blob(name):
+        # Файл загружен до хранилища блобов - переносим его туда
+        storage = Lesson._meta.get_field('file').storage
+        with storage.open(name) as source:
+            name = storage.save(name, source)
+    return name
+
+
+def clone_course(course, author, name=None):
+    """Копия курса с уроками и разделами. Возвращает новый курс"""
+    lessons = list(Lesson.objects.filter(course=course).values('id', *LESSON_FIELDS))
+    sections = list(
+        LessonSection.objects.filter(lesson__in=[lesson['id'] for lesson in lessons])
+        .values_list('lesson_id', 'position', 'title', 'html')
+    )
+
+    with transaction.atomic():
+        copy = Course.objects.create(
+            author=author,
+            category_id=course.category_id,
+            name=name or f'{course.name} (копия)'[:200],
+            description=course.description
+        )
+
+        originals = [lesson.pop('id') for lesson in lessons]
+        for lesson in lessons:
+            if lesson['file']:
+                lesson['file'] = share_file(lesson['file'])
+        created = Lesson.objects.bulk_create([Lesson(course=copy, **lesson) for lesson in lessons])
+        # bulk_create не вызывает post_save - ссылки на файлы учитываем сами
+        blobstore.acquire([lesson['file'] for lesson in lessons if lesson['file']])
+
+        new_ids = {old_id: lesson.pk for old_id, lesson in zip(originals, created)}
+        LessonSection.objects.bulk_create([
+            LessonSection(lesson_id=new_ids[lesson_id], position=position, title=title, html=html)
+            for lesson_id, position, title, html in sections
+        ])
+
+        # bulk_create не вызывает post_save - уроки копии попадут в подсказки при перестройке
+        transaction.on_commit(autocomplete.invalidate)
+    return copy
@@ -0,0 +1,174 @@
+import hashlib
+import re
+from html import escape
+
+
+# Увеличить при любом изменении рендера - уроки перерисуются при следующем чтении
+# или командой render_lessons
+RENDERER_VERSION = 3
+
+# Примерный размер раздела длинного урока (в символах исходного текста)
+SECTION_SIZE = 20000
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_LIST_ITEM = re.compile(r'^\s*(?:[-*+]|(\d+)\.)\s+(.*)$')
+_FENCE = re.compile(r'^```')
+_SECTION_HEADING = re.compile(r'^#{1,2}\s+(.*)$')
+_MARKUP = re.compile(r'[*_`#\[\]]|\(\S*\)')
+
+_INLINE_CODE = re.compile(r'`([^`]+)`')
+_BOLD = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+_ITALIC = re.compile(r'(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?!\*)|(?<![_\w])_(?!\s)(.+?)(?<!\s)_(?!\w)')
+# Текст ссылки и адрес уже экранированы; разрешены только http(s), mailto и относительные пути
+_LINK = re.compile(r'\[([^\]]+)\]\(((?:https?://|mailto:|/)[^\s)]*)\)')
+_PLACEHOLDER = re.compile(r'\x00(\d+)\x00')
+
+
+def content_hash(text):
+    """Хеш исходного текста урока (для проверки, нужен ли перерендер)"""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def _inline(text):
+    text = escape(text, quote=True)
+
+    # Код и ссылки вырезаем, чтобы внутри них не срабатывало выделение
+    stashed = []
+
+    def stash(html):
+        stashed.append(html)
+        return f'\x00{len(stashed) - 1}\x00'
+
+    text = _INLINE_CODE.sub(lambda m: stash(f'<code>{m.group(1)}</code>'), text)
+    text = _LINK.sub(
+        lambda m: stash(f'<a href="{m.group(2)}" rel="nofollow noopener" target="_blank">{m.group(1)}</a>'),
+        text
+    )
+    text = _BOLD.sub(lambda m: f'<strong>{m.group(1) or m.group(2)}</strong>', text)
+    text = _ITALIC.sub(lambda m: f'<em>{m.group(1) or m.group(2)}</em>', text)
+
+    def restore(match):
+        # Вырезанный фрагмент сам может содержать метки (код в тексте ссылки)
+        return _PLACEHOLDER.sub(restore, stashed[int(match.group(1))])
+
+    return _PLACEHOLDER.sub(restore, text)
+
+
+def render_markdown(text):
+    """Markdown (заголовки, списки, код, ссылки, выделение) -> безопасный HTML
+
+    Весь пользовательский текст экранируется, теги создает только сам рендер,
+    поэтому отдельная санитизация результата не нужна.
+    """
+    html = []
+    paragraph = []
+    list_tag = None
+    code = None
+
+    def close_paragraph():
+        if paragraph:
+            html.append('<p>' + '<br>'.join(_inline(line) for line in paragraph) + '</p>')
+            paragraph.clear()
+
+    def close_list():
+        nonlocal list_tag
+        if list_tag:
+            html.append(f'</{list_tag}>')
+            list_tag = None
+
+    text = (text or '').replace('\x00', '').replace('\r\n', '\n')
+    for line in text.split('\n'):
+        if code is not None:
+            if _FENCE.match(line):
+                html.append('<pre><code>' + escape('\n'.join(code)) + '</code></pre>')
+                code = None
+            else:
+                code.append(line)
+            continue
+
+        if _FENCE.match(line):
+            close_paragraph()
+            close_list()
+            code = []
+            continue
+
+        if not line.strip():
+            close_paragraph()
+            close_list()
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            close_paragraph()
+            close_list()
+            level = len(heading.group(1))
+            html.append(f'<h{level}>{_inline(heading.group(2))}</h{level}>')
+            continue
+
+        item = _LIST_ITEM.match(line)
+        if item:
+            close_paragraph()
+            tag = 'ol' if item.group(1) else 'ul'
+            if list_tag != tag:
+                close_list()
+                html.append(f'<{tag}>')
+                list_tag = tag
+            html.append(f'<li>{_inline(item.group(2))}</li>')
+            continue
+
+        close_list()
+        paragraph.append(line)
+
+    if code is not None:
+        html.append('<pre><code>' + escape('\n'.join(code)) + '</code></pre>')
+    close_paragraph()
+    close_list()
+
+    return '\n'.join(html)
+
+
+def split_sections(text, size=SECTION_SIZE):
+    """Разбить исходный текст на разделы [(заголовок, текст)]
+
+    Новый раздел начинается с заголовка первого/второго уровня или, если
+    заголовков нет, на пустой строке после size символов. Внутри блоков кода
+    текст не режется.
+    """
+    text = (text or '').replace('\r\n', '\n')
+    sections = []
+    title = ''
+    lines = []
+    length = 0
+    in_code = False
+
+    def flush():
+        if any(line.strip() for line in lines):
+            sections.append((title, '\n'.join(lines)))
+
+    for line in text.split('\n'):
+        if _FENCE.match(line):
+            in_code = not in_code
+
+        if not in_code:
+            heading = _SECTION_HEADING.match(line)
+            if heading and length:
+                flush()
+                lines, length = [], 0
+            if heading and not lines:
+                title = _MARKUP.sub('', heading.group(1)).strip()
+            elif not line.strip() and length >= size:
+                flush()
+                lines, length, title = [], 0, ''
+                continue
+
+        lines.append(line)
+        length += len(line) + 1
+
+    flush()
+
+    if not sections:
+        return [('', '')]
+    return [
+        (title or f'Часть {position + 1}', chunk)
+        for position, (title, chunk) in enumerate(sections)
+    ]
@@ -0,0 +1,182 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+
+# Живые обновления (Server-Sent Events, см. views.course_events).
+# Подписчик - очередь в памяти процесса, без отдельного потока: ожидание
+# идет в event loop ASGI-сервера. Публикация возможна из любого потока
+# (обычные sync-представления), доставка - через call_soon_threadsafe.
+# Между воркерами события передает бэкенд из настройки EVENTS_BACKEND.
+
+SUBSCRIBER_BUFFER = 100     # событий в очереди одного подключения
+HEARTBEAT_SECONDS = 15
+
+
+def course_channel(course_id):
+    return f'course:{course_id}'
+
+
+def progress_channel(user_id, course_id):
+    return f'progress:{user_id}:{course_id}'
+
+
+class Subscription:
+    """Очередь событий одного подключения; при переполнении старые события теряются"""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.buffer = deque(maxlen=SUBSCRIBER_BUFFER)
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def push(self, event):
+        # Вызывается только в потоке event loop подписчика
+        if len(self.buffer) == self.buffer.maxlen:
+            self.overflowed = True
+        self.buffer.append(event)
+        self.ready.set()
+
+    async def get(self, timeout):
+        """Следующие события (пустой список - истек timeout)"""
+        if not self.buffer:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        events = list(self.buffer)
+        if self.overflowed:
+            # Клиент пропустил события - пусть перезагрузит состояние целиком
+            events.insert(0, ('overflow', None, {}))
+            self.overflowed = False
+        self.buffer.clear()
+        self.ready.clear()
+        return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Pub/sub в памяти процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def deliver(self, channel, kind, data):
+        """Раздать событие подписчикам канала в этом процессе"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        if not subscribers:
+            return
+        event = (kind, next(self._ids), data)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # Event loop уже закрыт - подключение умерло вместе с ним
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+
+class LocalBackend:
+    """Бэкенд для одного процесса: событие сразу раздается локальным подписчикам
+
+    Для нескольких воркеров нужен бэкенд с тем же интерфейсом, который
+    пересылает событие через общий канал (например, Redis pub/sub) и в
+    каждом воркере вызывает broker.deliver.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, channel, kind, data):
+        self.broker.deliver(channel, kind, data)
+
+
+broker = Broker()
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        backend_class = import_string(getattr(settings, 'EVENTS_BACKEND', 'main.events.LocalBackend'))
+        _backend = backend_class(broker)
+    return _backend
+
+
+def publish(channel, kind, data):
+    # Данные сериализуются сразу: подписчики получают готовую строку
+    get_backend().publish(channel, kind, json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def format_event(kind, event_id, data):
+    lines = [f'event: {kind}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {data if isinstance(data, str) else json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def stream(channels):
+    """Поток SSE для подписки на каналы (асинхронный генератор строк)"""
+    subscription = broker.subscribe(channels)
+    try:
+        # Подсказка браузеру, через сколько переподключаться
+        yield 'retry: 3000\n\n'
+        while True:
+            events = await subscription.get(HEARTBEAT_SECONDS)
+            if not events:
+                yield ': ping\n\n'
+                continue
+            yield ''.join(format_event(*event) for event in events)
+    finally:
+        subscription.close()
+
+
+def publish_comment(comment):
+    publish(course_channel(comment.course_id), 'comment', {
+        'id': comment.id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created_at': comment.created_at,
+    })
+
+
+def publish_progress(user, course_id, lessons, completed_count):
+    """lessons - {lesson_id: completed}"""
+    publish(progress_channel(user.pk, course_id), 'progress', {
+        'course': course_id,
+        'lessons': [{'id': lesson_id, 'completed': completed} for lesson_id, completed in lessons.items()],
+        'completed': completed_count,
+    })
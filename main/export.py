@@ -0,0 +1,79 @@
+import csv
+
+from . import progress as progress_store
+from .models import Lesson, Progress, ProgressArchive
+
+
+# Столбцы выгрузки прогресса (порядок совпадает с values_list ниже)
+EXPORT_HEADER = [
+    'user_id',
+    'username',
+    'email',
+    'lesson_id',
+    'lesson_order',
+    'lesson_title',
+    'completed',
+    'started_at',
+    'updated_at',
+]
+
+EXPORT_FIELDS = [
+    'user_id',
+    'user__username',
+    'user__email',
+    'lesson_id',
+    'lesson__order',
+    'lesson__title',
+    'completed',
+    'started_at',
+    'updated_at',
+]
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def course_progress_rows(course_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Кортежи прогресса по курсу без создания моделей (память не растет).
+    Сначала строки Progress, затем развернутый архив неактивных учеников"""
+    yield from (
+        Progress.objects
+        .filter(lesson__course_id=course_id)
+        .order_by('lesson__order', 'user_id')
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+    # В архиве только завершенные уроки; даты - начало и последняя активность по курсу
+    lessons = {
+        lesson_id: (order, title)
+        for lesson_id, order, title in Lesson.objects.filter(course_id=course_id).values_list('id', 'order', 'title')
+    }
+    archived = progress_store.expand_archive(
+        ProgressArchive.objects.filter(course_id=course_id),
+        'user_id', 'user__username', 'user__email', 'started_at', 'last_activity'
+    )
+    for lesson_id, user_id, username, email, started_at, last_activity in archived:
+        order, title = lessons[lesson_id]
+        yield user_id, username, email, lesson_id, order, title, True, started_at, last_activity
+
+
+def iter_progress_csv(course_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Генератор CSV кусками по chunk_size строк"""
+    writer = csv.writer(_Echo())
+    lines = [writer.writerow(EXPORT_HEADER)]
+
+    for row in course_progress_rows(course_id, chunk_size):
+        lines.append(writer.writerow(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+
+    if lines:
+        yield ''.join(lines)
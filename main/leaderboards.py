@@ -0,0 +1,137 @@
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from . import progress as progress_store
+from .models import LeaderboardEntry, Lesson, Progress, ProgressArchive
+
+
+# Виды рейтинга: по числу завершенных уроков и по скорости прохождения курса
+SCORE = 'score'
+FASTEST = 'fastest'
+
+
+def record_completion(user, lesson, completed):
+    """Инкрементально обновить рейтинг курса и общий рейтинг после переключения урока"""
+    apply_deltas(user, {lesson.course_id: 1 if completed else -1})
+
+
+def apply_deltas(user, deltas):
+    """Применить изменения числа завершенных уроков {course_id: +n/-n} к рейтингам"""
+    deltas = {course_id: delta for course_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    now = timezone.now()
+    totals = dict(
+        Lesson.objects.filter(course_id__in=deltas)
+        .values_list('course_id').annotate(n=Count('id')).order_by()
+    )
+
+    with transaction.atomic():
+        for course_id, delta in list(deltas.items()) + [(None, sum(deltas.values()))]:
+            entry, created = LeaderboardEntry.objects.select_for_update().get_or_create(
+                user=user,
+                course_id=course_id
+            )
+            entry.lessons_completed = max(entry.lessons_completed + delta, 0)
+
+            if course_id is not None:
+                if entry.lessons_completed >= totals.get(course_id, 0):
+                    if entry.finished_at is None:
+                        entry.finished_at = now
+                        entry.duration = now - entry.started_at
+                else:
+                    entry.finished_at = None
+                    entry.duration = None
+
+            entry.save()
+
+
+def _ordered(course_id, kind):
+    entries = LeaderboardEntry.objects.filter(course_id=course_id)
+    if kind == FASTEST:
+        return entries.filter(duration__isnull=False).order_by('duration', 'user_id')
+    return entries.filter(lessons_completed__gt=0).order_by('-lessons_completed', 'user_id')
+
+
+def top(course_id=None, kind=SCORE, page=1, per_page=20):
+    """Страница рейтинга (читается по индексу, без подсчета Progress)"""
+    entries = _ordered(course_id, kind).select_related('user')
+    return Paginator(entries, per_page).get_page(page)
+
+
+def rank(user, course_id=None, kind=SCORE):
+    """Место пользователя в рейтинге или None, если его там нет"""
+    if not user.is_authenticated:
+        return None
+
+    entry = _ordered(course_id, kind).filter(user=user).first()
+    if entry is None:
+        return None
+
+    # Считаем тех, кто выше: диапазонный запрос по тому же индексу, что и сортировка.
+    # Это O(места) по индексу, а не O(log n): хранимое место пришлось бы переписывать
+    # у всех, кого обогнали, при каждом завершенном уроке
+    if kind == FASTEST:
+        ahead = Q(duration__lt=entry.duration) | Q(duration=entry.duration, user_id__lt=entry.user_id)
+    else:
+        ahead = (
+            Q(lessons_completed__gt=entry.lessons_completed) |
+            Q(lessons_completed=entry.lessons_completed, user_id__lt=entry.user_id)
+        )
+    return _ordered(course_id, kind).filter(ahead).count() + 1
+
+
+def rebuild():
+    """Полностью пересобрать рейтинги из Progress и архива прогресса (первичное заполнение)"""
+    totals = dict(
+        Lesson.objects.values_list('course_id').annotate(n=Count('id')).order_by()
+    )
+
+    rows = (
+        Progress.objects.filter(completed=True)
+        .values_list('user_id', 'lesson__course_id')
+        .annotate(n=Count('id'), first=Min('started_at'), last=Max('updated_at'))
+        .order_by()
+    )
+    scores = {
+        (user_id, course_id): [n, first, last]
+        for user_id, course_id, n, first, last in rows.iterator(chunk_size=2000)
+    }
+
+    # Архив: биты существующих уроков, даты - начало и последняя активность по курсу
+    archived = progress_store.expand_archive(
+        ProgressArchive.objects.all(), 'user_id', 'course_id', 'started_at', 'last_activity'
+    )
+    for lesson_id, user_id, course_id, first, last in archived:
+        score = scores.setdefault((user_id, course_id), [0, first, last])
+        score[0] += 1
+        score[1], score[2] = min(score[1], first), max(score[2], last)
+
+    entries = []
+    global_scores = {}
+    for (user_id, course_id), (n, first, last) in scores.items():
+        finished = n >= totals.get(course_id, 0)
+        entries.append(LeaderboardEntry(
+            user_id=user_id,
+            course_id=course_id,
+            lessons_completed=n,
+            started_at=first,
+            finished_at=last if finished else None,
+            duration=last - first if finished else None
+        ))
+        score, started = global_scores.get(user_id, (0, first))
+        global_scores[user_id] = (score + n, min(started, first))
+
+    entries.extend(
+        LeaderboardEntry(user_id=user_id, course_id=None, lessons_completed=score, started_at=started)
+        for user_id, (score, started) in global_scores.items()
+    )
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+
+    return len(entries)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from main.archive import DEFAULT_INACTIVE_DAYS, archive_cold_progress
+
+
+class Command(BaseCommand):
+    help = 'Свернуть прогресс неактивных пользователей и пройденных курсов в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEFAULT_INACTIVE_DAYS,
+            help='Сколько дней без активности считать прогресс холодным'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Сколько пар (пользователь, курс) обработать за запуск'
+        )
+
+    def handle(self, *args, **options):
+        pairs, deleted = archive_cold_progress(options['days'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Архивировано пар: {pairs}, удалено строк прогресса: {deleted}'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from main.progress import build_bitmaps
+
+
+class Command(BaseCommand):
+    help = 'Заполнить битовые карты прогресса из Progress и архива (для PROGRESS_BITMAPS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк записывать за раз'
+        )
+
+    def handle(self, *args, **options):
+        count = build_bitmaps(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Карт прогресса: {count}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main.recommendations import DEFAULT_TOP_K, refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчет рекомендаций "ученики также проходят"'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать все курсы, а не только затронутые с прошлого запуска'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=DEFAULT_TOP_K,
+            help='Сколько рекомендаций хранить на курс'
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_recommendations(full=options['full'], top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено курсов: {count}'))
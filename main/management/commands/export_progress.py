@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.export import DEFAULT_CHUNK_SIZE, iter_progress_csv
+from main.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка прогресса учеников курса в CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument(
+            '--output', '-o',
+            help='Путь к файлу (по умолчанию stdout)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Сколько строк читать из БД за раз'
+        )
+
+    def handle(self, *args, **options):
+        course_id = options['course_id']
+        if not Course.objects.filter(id=course_id).exists():
+            raise CommandError(f'Курс {course_id} не найден')
+
+        chunks = iter_progress_csv(course_id, options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            self.stdout.write(self.style.SUCCESS(f'Прогресс сохранен в {options["output"]}'))
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from main import blobstore
+from main.models import Blob
+
+
+class Command(BaseCommand):
+    help = 'Сборка мусора в хранилище файлов: удалить блобы, на которые не ссылается ни одна строка'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=blobstore.DEFAULT_GRACE_HOURS,
+            help='Не удалять блобы, использованные за последние часы (загрузки в процессе)'
+        )
+        parser.add_argument(
+            '--adopt-legacy',
+            action='store_true',
+            help='Сначала перенести в хранилище файлы, загруженные до него'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['adopt_legacy']:
+            moved = blobstore.adopt_legacy(dry_run)
+            verb = 'Будет перенесено' if dry_run else 'Перенесено'
+            self.stdout.write(f'{verb} старых файлов: {moved}')
+
+        fixed = blobstore.recount(dry_run)
+        verb = 'Будет исправлено' if dry_run else 'Исправлено'
+        self.stdout.write(f'{verb} счетчиков ссылок: {fixed}')
+
+        removed, freed = blobstore.collect(options['grace_hours'], dry_run)
+        stats = Blob.objects.aggregate(blobs=Count('id'), size=Sum('size'))
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {removed} ({freed / 1024 / 1024:.1f} МБ). '
+            f'В хранилище: {stats["blobs"]} ({(stats["size"] or 0) / 1024 / 1024:.1f} МБ)'
+        ))
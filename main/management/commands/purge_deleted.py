@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main.purge import DEFAULT_BATCH_SIZE, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Фоновое удаление курсов и уроков, помеченных как удаленные'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Сколько строк удалять в одной транзакции'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Сколько задач выполнить за запуск'
+        )
+
+    def handle(self, *args, **options):
+        done = run_pending(options['batch_size'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
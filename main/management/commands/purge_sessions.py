@@ -0,0 +1,38 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Удалить истекшие сессии пачками (без долгой блокировки таблицы)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько сессий удалять за раз'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Пауза между пачками в секундах'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+        deleted = 0
+
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Удалено сессий: {deleted}'))
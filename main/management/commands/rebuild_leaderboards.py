@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.leaderboards import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать рейтинги из таблицы прогресса'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Записей в рейтинге: {count}'))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from main.content import RENDERER_VERSION
+from main.models import Lesson
+
+
+class Command(BaseCommand):
+    help = 'Перерендерить HTML уроков пачками (после смены версии рендера)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Сколько уроков обрабатывать за раз'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перерендерить все уроки, даже актуальные'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        lessons = Lesson.objects.order_by('pk').only('pk', 'content', 'content_hash', 'renderer_version')
+        if not options['force']:
+            lessons = lessons.filter(~Q(renderer_version=RENDERER_VERSION) | Q(content_hash=''))
+
+        fields = ['content_html', 'content_hash', 'renderer_version']
+        rendered = 0
+        last_pk = 0
+        while True:
+            batch = list(lessons.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            for lesson in batch:
+                if options['force']:
+                    lesson.content_hash = ''
+                lesson.render_content()
+            with transaction.atomic():
+                Lesson.objects.bulk_update(batch, fields)
+                for lesson in batch:
+                    lesson.save_sections()
+            rendered += len(batch)
+            self.stdout.write(f'Обработано уроков: {rendered}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, перерендерено уроков: {rendered}'))
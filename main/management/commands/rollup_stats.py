@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Инкрементальный пересчет дневной статистики курсов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Пересчитать всю историю, не глядя на отметку'
+        )
+        parser.add_argument(
+            '--since',
+            help='Пересчитать начиная с даты (ГГГГ-ММ-ДД)'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.strptime(options['since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('Дата должна быть в формате ГГГГ-ММ-ДД')
+
+        days = refresh_rollups(backfill=options['backfill'], since=since)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано дней: {days}'))
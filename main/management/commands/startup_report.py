@@ -0,0 +1,123 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+# Холодный старт в отдельном процессе: импорт WSGI-приложения (с прогревом) и два запроса
+_BENCHMARK = '''
+import json, time
+started = time.perf_counter()
+from Areon2.wsgi import application
+booted = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+
+def request(path):
+    environ = {"PATH_INFO": path}
+    setup_testing_defaults(environ)
+    status = []
+    begin = time.perf_counter()
+    b"".join(application(environ, lambda s, h, e=None: status.append(s)))
+    return status[0], (time.perf_counter() - begin) * 1000
+
+status, first = request(%(path)r)
+_, second = request(%(path)r)
+print(json.dumps({
+    "boot_ms": (booted - started) * 1000,
+    "first_request_ms": first,
+    "second_request_ms": second,
+    "status": status,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Время холодного старта воркера и самые медленные импорты'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=20,
+            help='Сколько самых медленных импортов показать'
+        )
+        parser.add_argument(
+            '--sort',
+            choices=['self', 'cumulative'],
+            default='self',
+            help='Сортировать по собственному или суммарному времени импорта'
+        )
+        parser.add_argument(
+            '--path',
+            default='/',
+            help='Адрес для первого запроса'
+        )
+        parser.add_argument(
+            '--max-ms',
+            type=float,
+            default=settings.STARTUP_TARGET_MS,
+            help='Цель для старта + первого запроса, мс (превышение - код ошибки)'
+        )
+        parser.add_argument(
+            '--no-warmup',
+            action='store_true',
+            help='Замерить без прогрева при старте (для сравнения)'
+        )
+
+    def _run(self, args, warmup):
+        env = dict(os.environ, DJANGO_WARMUP='1' if warmup else '0')
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'Areon2.settings')
+        return subprocess.run(
+            [sys.executable, *args],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+
+    def import_times(self, warmup):
+        result = self._run(['-X', 'importtime', '-c', 'import Areon2.wsgi'], warmup)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        rows = []
+        for line in result.stderr.splitlines():
+            match = _IMPORT_LINE.match(line)
+            if match:
+                own, cumulative, indent, module = match.groups()
+                rows.append((int(own), int(cumulative), len(indent) // 2, module))
+        return rows
+
+    def benchmark(self, path, warmup):
+        result = self._run(['-c', _BENCHMARK % {'path': path}], warmup)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        warmup = not options['no_warmup']
+
+        rows = self.import_times(warmup)
+        key = 0 if options['sort'] == 'self' else 1
+        total = sum(own for own, cumulative, depth, module in rows)
+        self.stdout.write(f'Импорт: {len(rows)} модулей, {total / 1000:.0f} мс')
+        self.stdout.write(f'{"self, мс":>10} {"всего, мс":>10}  модуль')
+        for row in sorted(rows, key=lambda row: row[key], reverse=True)[:options['top']]:
+            own, cumulative, depth, module = row
+            self.stdout.write(f'{own / 1000:>10.1f} {cumulative / 1000:>10.1f}  {module}')
+
+        result = self.benchmark(options['path'], warmup)
+        cold = result['boot_ms'] + result['first_request_ms']
+        self.stdout.write('')
+        self.stdout.write(f'Старт воркера{"" if warmup else " (без прогрева)"}: {result["boot_ms"]:.0f} мс')
+        self.stdout.write(f'Первый запрос {options["path"]} ({result["status"]}): {result["first_request_ms"]:.0f} мс')
+        self.stdout.write(f'Второй запрос: {result["second_request_ms"]:.0f} мс')
+
+        if cold > options['max_ms']:
+            raise CommandError(f'Холодный старт {cold:.0f} мс дольше цели {options["max_ms"]:.0f} мс')
+        self.stdout.write(self.style.SUCCESS(f'Холодный старт {cold:.0f} мс (цель {options["max_ms"]:.0f} мс)'))
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.pagecache import DEFAULT_DAYS, DEFAULT_TOP, DEFAULT_WORKERS, warm_popular_courses
+
+
+class Command(BaseCommand):
+    help = 'Заполнить кеш страниц самых активных курсов (после деплоя или сброса кеша)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=DEFAULT_TOP,
+            help='Сколько курсов прогреть'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=DEFAULT_DAYS,
+            help='За сколько дней считать активность Progress'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help='Число потоков'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить, даже если значения уже в кеше'
+        )
+
+    def handle(self, *args, **options):
+        if settings.CACHES['default']['BACKEND'].endswith('LocMemCache'):
+            # Кеш в памяти процесса команды воркерам не виден
+            self.stdout.write(self.style.WARNING(
+                'LocMemCache не общий для процессов: для воркеров используйте DJANGO_WARM_CACHE=1'
+            ))
+        started = time.perf_counter()
+        course_ids = warm_popular_courses(
+            top=options['top'],
+            days=options['days'],
+            workers=options['workers'],
+            force=options['force']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето курсов: {len(course_ids)} за {time.perf_counter() - started:.2f} с'
+        ))
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_lesson_content'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('new_learners', models.PositiveIntegerField(default=0, verbose_name='Новые ученики')),
+                ('completions', models.PositiveIntegerField(default=0, verbose_name='Завершено уроков')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментарии')),
+                ('active_users', models.PositiveIntegerField(default=0, verbose_name='Активные пользователи')),
+            ],
+            options={
+                'verbose_name': 'Статистика курса за день',
+                'verbose_name_plural': 'Статистика курсов по дням',
+                'ordering': ['course', 'date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LessonDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('completions', models.PositiveIntegerField(default=0, verbose_name='Завершено')),
+            ],
+            options={
+                'verbose_name': 'Статистика урока за день',
+                'verbose_name_plural': 'Статистика уроков по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Задача')),
+                ('value', models.DateTimeField(blank=True, null=True, verbose_name='Обработано до')),
+            ],
+            options={
+                'verbose_name': 'Отметка обработки',
+                'verbose_name_plural': 'Отметки обработки',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created_at'], name='main_commen_created_c43ef2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progress',
+            index=models.Index(fields=['updated_at'], name='main_progre_updated_91797f_idx'),
+        ),
+        migrations.AddField(
+            model_name='coursedailystats',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='main.course', verbose_name='Курс'),
+        ),
+        migrations.AddField(
+            model_name='lessondailystats',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_daily_stats', to='main.course', verbose_name='Курс'),
+        ),
+        migrations.AddField(
+            model_name='lessondailystats',
+            name='lesson',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='main.lesson', verbose_name='Урок'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='coursedailystats',
+            unique_together={('course', 'date')},
+        ),
+        migrations.AddIndex(
+            model_name='lessondailystats',
+            index=models.Index(fields=['course', 'date'], name='main_lesson_course__d4ba81_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='lessondailystats',
+            unique_together={('lesson', 'date')},
+        ),
+    ]
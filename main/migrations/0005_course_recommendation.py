@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Близость')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='main.course', verbose_name='Курс')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.course', verbose_name='Рекомендуемый курс')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация',
+                'verbose_name_plural': 'Рекомендации',
+                'ordering': ['course', 'rank'],
+                'unique_together': {('course', 'rank')},
+            },
+        ),
+    ]
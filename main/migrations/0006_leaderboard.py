@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_course_recommendation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lessons_completed', models.PositiveIntegerField(default=0, verbose_name='Завершено уроков')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Курс пройден')),
+                ('duration', models.DurationField(blank=True, null=True, verbose_name='Время прохождения')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='main.course', verbose_name='Курс')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Место в рейтинге',
+                'verbose_name_plural': 'Рейтинг',
+                'indexes': [models.Index(fields=['course', '-lessons_completed', 'user'], name='leaderboard_score_idx'), models.Index(fields=['course', 'duration', 'user'], name='leaderboard_fastest_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'course'), name='leaderboard_user_course'), models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('user',), name='leaderboard_user_global')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хеш содержания'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Содержание (HTML)'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='renderer_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Версия рендера'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_lesson_content_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Номер раздела')),
+                ('title', models.CharField(max_length=200, verbose_name='Заголовок')),
+                ('html', models.TextField(verbose_name='HTML раздела')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sections', to='main.lesson', verbose_name='Урок')),
+            ],
+            options={
+                'verbose_name': 'Раздел урока',
+                'verbose_name_plural': 'Разделы уроков',
+                'ordering': ['lesson', 'position'],
+                'unique_together': {('lesson', 'position')},
+            },
+        ),
+    ]
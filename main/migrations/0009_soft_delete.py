@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_lesson_section'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Удален'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Удален'),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Курс'), ('lesson', 'Урок')], max_length=10, verbose_name='Что удаляется')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('name', models.CharField(max_length=200, verbose_name='Название')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('total_rows', models.PositiveBigIntegerField(default=0, verbose_name='Всего записей')),
+                ('deleted_rows', models.PositiveBigIntegerField(default=0, verbose_name='Удалено записей')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deletion_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Удаление',
+                'verbose_name_plural': 'Удаления',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='main_deleti_status_09666d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def assign_slots(apps, schema_editor):
+    # Существующим урокам слоты раздаются по порядку создания внутри курса
+    Lesson = apps.get_model('main', 'Lesson')
+    slots = {}
+    batch = []
+    for lesson in Lesson.objects.order_by('course_id', 'id').only('id', 'course_id').iterator(chunk_size=2000):
+        lesson.slot = slots.get(lesson.course_id, 0)
+        slots[lesson.course_id] = lesson.slot + 1
+        batch.append(lesson)
+        if len(batch) >= 1000:
+            Lesson.objects.bulk_update(batch, ['slot'])
+            batch = []
+    Lesson.objects.bulk_update(batch, ['slot'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_soft_delete'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='slot',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Слот'),
+        ),
+        migrations.RunPython(assign_slots, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='lesson',
+            name='slot',
+            field=models.PositiveIntegerField(editable=False, verbose_name='Слот'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='lesson',
+            unique_together={('course', 'order'), ('course', 'slot')},
+        ),
+        migrations.CreateModel(
+            name='ProgressArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_slots', models.BinaryField(default=bytes, verbose_name='Завершенные уроки (биты)')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Завершено уроков')),
+                ('started_at', models.DateTimeField(verbose_name='Начало')),
+                ('last_activity', models.DateTimeField(verbose_name='Последняя активность')),
+                ('archived_at', models.DateTimeField(auto_now=True, verbose_name='Архивировано')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_archive', to='main.course', verbose_name='Курс')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_archive', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архив прогресса',
+                'verbose_name_plural': 'Архив прогресса',
+                'unique_together': {('user', 'course')},
+            },
+        ),
+    ]
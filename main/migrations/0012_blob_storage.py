@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:45
+
+import django.utils.timezone
+import main.blobstore
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_course_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь в хранилище')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Размер, байт')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('last_used', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Последнее использование')),
+            ],
+            options={
+                'verbose_name': 'Файл хранилища',
+                'verbose_name_plural': 'Файлы хранилища',
+            },
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=main.blobstore.blob_storage, upload_to='lessons/files/', verbose_name='Файл урока'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=main.blobstore.blob_storage, upload_to='avatars/', verbose_name='Аватар'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_blob_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Номер версии')),
+                ('base_number', models.PositiveIntegerField(verbose_name='Номер снимка')),
+                ('is_snapshot', models.BooleanField(default=False, verbose_name='Полный снимок')),
+                ('data', models.BinaryField(verbose_name='Данные')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='Хеш содержания')),
+                ('content_size', models.PositiveIntegerField(default=0, verbose_name='Длина текста')),
+                ('message', models.CharField(blank=True, max_length=200, verbose_name='Комментарий')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lesson_revisions', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='main.lesson', verbose_name='Урок')),
+            ],
+            options={
+                'verbose_name': 'Версия урока',
+                'verbose_name_plural': 'Версии уроков',
+                'unique_together': {('lesson', 'number')},
+            },
+        ),
+    ]
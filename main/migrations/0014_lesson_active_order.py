@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_lesson_revisions'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='lesson',
+            unique_together={('course', 'slot')},
+        ),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('course', 'order'), name='unique_active_lesson_order'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:55
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_updated_at(apps, schema_editor):
+    # Для существующих строк время изменения - время последней записи
+    Progress = apps.get_model('main', 'Progress')
+    Progress.objects.update(changed_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_lesson_active_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progress',
+            name='changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменено'),
+        ),
+        migrations.RunPython(copy_updated_at, migrations.RunPython.noop),
+    ]
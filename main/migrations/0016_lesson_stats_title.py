@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:58
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_lesson_fields(apps, schema_editor):
+    # Заполнить копии порядка и названия в уже собранной статистике
+    Lesson = apps.get_model('main', 'Lesson')
+    LessonDailyStats = apps.get_model('main', 'LessonDailyStats')
+    lesson = Lesson.objects.filter(pk=OuterRef('lesson_id'))
+    LessonDailyStats.objects.update(
+        lesson_order=Subquery(lesson.values('order')[:1]),
+        lesson_title=Subquery(lesson.values('title')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_progress_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessondailystats',
+            name='lesson_order',
+            field=models.PositiveIntegerField(default=0, verbose_name='Порядок урока'),
+        ),
+        migrations.AddField(
+            model_name='lessondailystats',
+            name='lesson_title',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Название урока'),
+        ),
+        migrations.RunPython(copy_lesson_fields, migrations.RunPython.noop),
+    ]
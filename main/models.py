@@ -1,6 +1,19 @@
-from django.db import models
+import os
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .blobstore import blob_storage
+from .content import RENDERER_VERSION, content_hash, render_markdown, split_sections
+
+
+class ActiveManager(models.Manager):
+    """Менеджер без мягко удаленных записей (они ждут фоновой очистки)"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Category(models.Model):
@@ -59,9 +72,17 @@ class Course(models.Model):
         auto_now=True,
         verbose_name="Дата обновления"
     )
-        
     
-
+    # Мягкое удаление: курс скрыт, данные удаляет фоновая задача (см. main/purge.py)
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Удален"
+    )
+    
+    objects = ActiveManager()
+    all_objects = models.Manager()
     
     class Meta:
         verbose_name = "Курс"
@@ -71,6 +92,12 @@ class Course(models.Model):
     def __str__(self):
         return self.name
     
+    @property
+    def category_name(self):
+        """Название категории из реестра в памяти (без запроса к БД)"""
+        from .categories import get_registry
+        return get_registry().name(self.category_id)
+    
     def get_total_lessons(self):
         """Получить общее количество уроков в курсе"""
         return self.lessons.count()
@@ -100,15 +127,42 @@ class Lesson(models.Model):
         verbose_name="Содержание урока"
     )
 
+    # Отрендеренный и безопасный HTML из content (обновляется при сохранении)
+    content_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name="Содержание (HTML)"
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name="Хеш содержания"
+    )
+    renderer_version = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Версия рендера"
+    )
+
     # Порядковый номер урока в курсе (интересная штука надо бы побольше попрактиковаться )
     order = models.PositiveIntegerField(
         default=0,
         verbose_name="Порядок"
     )
+
+    # Постоянный номер урока в курсе (не меняется при смене порядка). Слот окончательно
+    # удаленного урока может достаться новому - purge снимает его биты в картах прогресса.
+    # По нему адресуются биты в картах прогресса, см. main/bitmaps.py
+    slot = models.PositiveIntegerField(
+        editable=False,
+        verbose_name="Слот"
+    )
     
-    # Файлы (видео, документы и т.д.)
+    # Файлы (видео, документы и т.д.). Одинаковые файлы хранятся один раз, см. main/blobstore.py
     file = models.FileField(
         upload_to='lessons/files/',
+        storage=blob_storage,
         blank=True,
         null=True,
         verbose_name="Файл урока"
@@ -123,15 +177,121 @@ class Lesson(models.Model):
         verbose_name="Дата обновления"
     )
     
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Удален"
+    )
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+    
     class Meta:
         verbose_name = "Урок"
         verbose_name_plural = "Уроки"
         ordering = ['course', 'order']  # Сортировка по курсу и порядку
-        unique_together = ['course', 'order']  # Уникальный порядок в рамках курса
+        unique_together = [
+            ['course', 'slot'],
+        ]
+        constraints = [
+            # Уникальный порядок в рамках курса. Мягко удаленный урок сохраняет
+            # свой order до фоновой очистки и не должен занимать номер
+            models.UniqueConstraint(
+                fields=['course', 'order'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='unique_active_lesson_order'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.course.name} - {self.title}"
 
+    @property
+    def file_name(self):
+        """Имя файла без каталога хранилища"""
+        return os.path.basename(self.file.name) if self.file else ''
+
+    def render_content(self):
+        """Перерендерить content, если он или версия рендера изменились. True - если было обновление"""
+        digest = content_hash(self.content)
+        if digest == self.content_hash and self.renderer_version == RENDERER_VERSION:
+            return False
+        self._rendered_sections = [
+            (title, render_markdown(chunk))
+            for title, chunk in split_sections(self.content)
+        ]
+        self.content_html = '\n'.join(html for title, html in self._rendered_sections)
+        self.content_hash = digest
+        self.renderer_version = RENDERER_VERSION
+        return True
+
+    def save_sections(self):
+        """Сохранить разделы, подготовленные render_content"""
+        sections = getattr(self, '_rendered_sections', None)
+        if sections is None:
+            return
+        self.sections.all().delete()
+        LessonSection.objects.bulk_create([
+            LessonSection(lesson=self, position=position, title=title[:200], html=html)
+            for position, (title, html) in enumerate(sections)
+        ])
+        self._rendered_sections = None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            if self.render_content() and update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'content_html', 'content_hash', 'renderer_version'}
+        with transaction.atomic():
+            if self.slot is None:
+                last = Lesson.all_objects.filter(course_id=self.course_id).aggregate(m=models.Max('slot'))['m']
+                self.slot = 0 if last is None else last + 1
+            super().save(*args, **kwargs)
+            self.save_sections()
+
+    @property
+    def rendered_content(self):
+        """HTML урока; после смены версии рендера перерисовывается один раз при чтении"""
+        if self.renderer_version != RENDERER_VERSION:
+            self.render_content()
+            if self.pk:
+                self.save(update_fields=['content_html', 'content_hash', 'renderer_version'])
+        return mark_safe(self.content_html)
+
+
+class LessonSection(models.Model):
+
+    # Раздел длинного урока: отдается отдельно, чтобы страница урока не зависела от его длины
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.CASCADE,
+        related_name='sections',
+        verbose_name="Урок"
+    )
+
+    position = models.PositiveIntegerField(
+        verbose_name="Номер раздела"
+    )
+
+    title = models.CharField(
+        max_length=200,
+        verbose_name="Заголовок"
+    )
+
+    html = models.TextField(
+        verbose_name="HTML раздела"
+    )
+
+    class Meta:
+        verbose_name = "Раздел урока"
+        verbose_name_plural = "Разделы уроков"
+        ordering = ['lesson', 'position']
+        unique_together = ['lesson', 'position']
+
+    def __str__(self):
+        return f"{self.lesson_id} - {self.position}. {self.title}"
+
 
 class Comment(models.Model):
 
@@ -171,6 +331,9 @@ class Comment(models.Model):
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ['-created_at']  # Новые комментарии первыми
+        indexes = [
+            models.Index(fields=['created_at']),  # для инкрементальной сборки статистики
+        ]
     
     def __str__(self):
         return f"{self.author.username} - {self.course.name}"
@@ -208,11 +371,20 @@ class Progress(models.Model):
         auto_now=True,
         verbose_name="Обновлено"
     )
+    # Время самого изменения: у офлайн-синхронизации - время события на клиенте,
+    # а updated_at - время записи на сервере. По нему решаются конфликты синхронизации
+    changed_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Изменено"
+    )
     
     class Meta:
         verbose_name = "Прогресс"
         verbose_name_plural = "Прогресс"
         unique_together = ['user', 'lesson']
+        indexes = [
+            models.Index(fields=['updated_at']),  # для инкрементальной сборки статистики
+        ]
     
     def __str__(self):
         status = "✓" if self.completed else "○"
@@ -247,6 +419,7 @@ class UserProfile(models.Model):
     # Аватар
     avatar = models.ImageField(
         upload_to='avatars/',
+        storage=blob_storage,
         blank=True,
         null=True,
         verbose_name="Аватар"
@@ -285,4 +458,491 @@ class Masage(models.Model):
     sername = models.TextField(
         blank= True
     )
-    
\ No newline at end of file
+
+
+class CourseDailyStats(models.Model):
+
+    # Предрассчитанная статистика курса за день (заполняется командой rollup_stats)
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+        verbose_name="Курс"
+    )
+
+    date = models.DateField(
+        verbose_name="День"
+    )
+
+    new_learners = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Новые ученики"
+    )
+    completions = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Завершено уроков"
+    )
+    comments = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Комментарии"
+    )
+    active_users = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Активные пользователи"
+    )
+
+    class Meta:
+        verbose_name = "Статистика курса за день"
+        verbose_name_plural = "Статистика курсов по дням"
+        ordering = ['course', 'date']
+        unique_together = ['course', 'date']
+
+    def __str__(self):
+        return f"{self.course_id} - {self.date}"
+
+
+class LessonDailyStats(models.Model):
+
+    # Завершения урока за день (детализация CourseDailyStats)
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+        verbose_name="Урок"
+    )
+
+    # Дублируем курс, чтобы выбирать статистику курса без JOIN
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='lesson_daily_stats',
+        verbose_name="Курс"
+    )
+
+    date = models.DateField(
+        verbose_name="День"
+    )
+
+    completions = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Завершено"
+    )
+
+    # Копия порядка и названия урока: панель статистики читает только сводные таблицы.
+    # Обновляется при сохранении урока (main/signals.py)
+    lesson_order = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Порядок урока"
+    )
+    lesson_title = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name="Название урока"
+    )
+
+    class Meta:
+        verbose_name = "Статистика урока за день"
+        verbose_name_plural = "Статистика уроков по дням"
+        unique_together = ['lesson', 'date']
+        indexes = [
+            models.Index(fields=['course', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.lesson_id} - {self.date}"
+
+
+class Watermark(models.Model):
+
+    # Отметка времени, до которой фоновые задачи уже обработали данные
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name="Задача"
+    )
+
+    value = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Обработано до"
+    )
+
+    class Meta:
+        verbose_name = "Отметка обработки"
+        verbose_name_plural = "Отметки обработки"
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class CourseRecommendation(models.Model):
+
+    # "Ученики этого курса также проходят..." (заполняется командой build_recommendations)
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name="Курс"
+    )
+
+    recommended = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Рекомендуемый курс"
+    )
+
+    rank = models.PositiveSmallIntegerField(
+        verbose_name="Место"
+    )
+
+    score = models.FloatField(
+        verbose_name="Близость"
+    )
+
+    class Meta:
+        verbose_name = "Рекомендация"
+        verbose_name_plural = "Рекомендации"
+        ordering = ['course', 'rank']
+        unique_together = ['course', 'rank']
+
+    def __str__(self):
+        return f"{self.course_id} -> {self.recommended_id}"
+
+
+class LeaderboardEntry(models.Model):
+
+    # Очки пользователя в рейтинге курса (course пустой - общий рейтинг).
+    # Обновляется инкрементально при завершении урока, см. main/leaderboards.py
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='leaderboard_entries',
+        verbose_name="Пользователь"
+    )
+
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='leaderboard_entries',
+        null=True,
+        blank=True,
+        verbose_name="Курс"
+    )
+
+    lessons_completed = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Завершено уроков"
+    )
+
+    started_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Начало"
+    )
+
+    # Заполняется, когда завершены все уроки курса
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Курс пройден"
+    )
+    duration = models.DurationField(
+        null=True,
+        blank=True,
+        verbose_name="Время прохождения"
+    )
+
+    class Meta:
+        verbose_name = "Место в рейтинге"
+        verbose_name_plural = "Рейтинг"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='leaderboard_user_course'),
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(course__isnull=True),
+                name='leaderboard_user_global'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['course', '-lessons_completed', 'user'], name='leaderboard_score_idx'),
+            models.Index(fields=['course', 'duration', 'user'], name='leaderboard_fastest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.lessons_completed}"
+
+
+class DeletionJob(models.Model):
+
+    # Фоновое удаление курса или урока (выполняет команда purge_deleted)
+    KIND_CHOICES = [
+        ('course', 'Курс'),
+        ('lesson', 'Урок'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Завершено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='deletion_jobs',
+        verbose_name="Автор"
+    )
+
+    kind = models.CharField(
+        max_length=10,
+        choices=KIND_CHOICES,
+        verbose_name="Что удаляется"
+    )
+
+    # Не ForeignKey: сам объект удаляется в конце задачи
+    object_id = models.PositiveBigIntegerField(
+        verbose_name="ID объекта"
+    )
+    name = models.CharField(
+        max_length=200,
+        verbose_name="Название"
+    )
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Статус"
+    )
+    total_rows = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Всего записей"
+    )
+    deleted_rows = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Удалено записей"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Ошибка"
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создано"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Завершено"
+    )
+
+    class Meta:
+        verbose_name = "Удаление"
+        verbose_name_plural = "Удаления"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.name} - {self.get_status_display()}"
+
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(int(self.deleted_rows / self.total_rows * 100), 99)
+
+
+class CourseProgress(models.Model):
+
+    # Компактный прогресс по курсу: бит N - завершен урок со slot = N.
+    # Поддерживается при каждой записи прогресса, читается при PROGRESS_BITMAPS = True
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='course_progress',
+        verbose_name="Пользователь"
+    )
+
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='user_progress',
+        verbose_name="Курс"
+    )
+
+    completed_slots = models.BinaryField(
+        default=bytes,
+        verbose_name="Завершенные уроки (биты)"
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Обновлено"
+    )
+
+    class Meta:
+        verbose_name = "Прогресс по курсу"
+        verbose_name_plural = "Прогресс по курсам"
+        unique_together = ['user', 'course']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.course_id}"
+
+
+class ProgressArchive(models.Model):
+
+    # Сжатый прогресс неактивного пользователя по курсу: вместо строки Progress
+    # на каждый урок - одна битовая карта завершенных слотов (см. main/archive.py)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='progress_archive',
+        verbose_name="Пользователь"
+    )
+
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name='progress_archive',
+        verbose_name="Курс"
+    )
+
+    completed_slots = models.BinaryField(
+        default=bytes,
+        verbose_name="Завершенные уроки (биты)"
+    )
+    completed_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Завершено уроков"
+    )
+
+    started_at = models.DateTimeField(
+        verbose_name="Начало"
+    )
+    last_activity = models.DateTimeField(
+        verbose_name="Последняя активность"
+    )
+    archived_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Архивировано"
+    )
+
+    class Meta:
+        verbose_name = "Архив прогресса"
+        verbose_name_plural = "Архив прогресса"
+        unique_together = ['user', 'course']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.course_id}: {self.completed_count}"
+
+
+class Blob(models.Model):
+
+    # Уникальное содержимое в хранилище файлов (main/blobstore.py).
+    # ref_count - сколько строк Lesson.file и UserProfile.avatar на него ссылаются
+    digest = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name="SHA-256"
+    )
+
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name="Путь в хранилище"
+    )
+
+    size = models.PositiveBigIntegerField(
+        verbose_name="Размер, байт"
+    )
+
+    ref_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Ссылок"
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создан"
+    )
+    last_used = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name="Последнее использование"
+    )
+
+    class Meta:
+        verbose_name = "Файл хранилища"
+        verbose_name_plural = "Файлы хранилища"
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class LessonRevision(models.Model):
+
+    # Версия текста урока (main/revisions.py). Хранится сжатой правкой
+    # к предыдущей версии; каждая SNAPSHOT_EVERY-я версия - полный снимок.
+    # base_number - номер снимка, от которого восстанавливается версия
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.CASCADE,
+        related_name='revisions',
+        verbose_name="Урок"
+    )
+
+    number = models.PositiveIntegerField(
+        verbose_name="Номер версии"
+    )
+    base_number = models.PositiveIntegerField(
+        verbose_name="Номер снимка"
+    )
+    is_snapshot = models.BooleanField(
+        default=False,
+        verbose_name="Полный снимок"
+    )
+
+    # zlib: текст (снимок) или JSON правки
+    data = models.BinaryField(
+        verbose_name="Данные"
+    )
+
+    content_hash = models.CharField(
+        max_length=64,
+        verbose_name="Хеш содержания"
+    )
+    content_size = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Длина текста"
+    )
+
+    author = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='lesson_revisions',
+        verbose_name="Автор"
+    )
+    message = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name="Комментарий"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата"
+    )
+
+    class Meta:
+        verbose_name = "Версия урока"
+        verbose_name_plural = "Версии уроков"
+        unique_together = ['lesson', 'number']
+
+    def __str__(self):
+        return f"{self.lesson_id} v{self.number}"
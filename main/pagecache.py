@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import leaderboards
+from .models import Comment, CourseRecommendation, Lesson, Progress
+
+
+# Кеш частей страниц курса и урока. Значение строит один запрос (single-flight),
+# остальные промахи по тому же ключу ждут его, а не идут в БД всем скопом.
+# Ключи включают версию курса: изменение уроков и комментариев ее увеличивает.
+
+OUTLINE_TIMEOUT = 24 * 60 * 60
+SIDEBAR_TIMEOUT = 60            # рейтинг меняется с каждым завершенным уроком
+LOCK_TIMEOUT = 30
+WAIT_STEP = 0.05
+
+DEFAULT_TOP = 20
+DEFAULT_DAYS = 7
+DEFAULT_WORKERS = 4
+
+OutlineLesson = namedtuple('OutlineLesson', ['id', 'course_id', 'title', 'order', 'slot'])
+
+_MISSING = object()
+# Потоки одного процесса ждут на локальной блокировке (по хешу ключа),
+# процессы - на замке в общем кеше. Построение значения не должно само
+# вызывать get_or_build: две блокировки в разном порядке - взаимоблокировка.
+_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+def get_or_build(key, build, timeout):
+    """Значение из кеша; при промахе строит его только один запрос"""
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    with _LOCKS[hash(key) % len(_LOCKS)]:
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            # Значение строит другой процесс - ждем результат
+            time.sleep(WAIT_STEP)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if time.monotonic() > deadline:
+                # Владелец замка, видимо, упал - строим сами
+                break
+
+        try:
+            value = build()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+    return value
+
+
+def _new_version():
+    # Версия от времени, а не с 1: после вытеснения ключа версии из кеша
+    # старые записи со "старыми" номерами не оживут
+    return time.time_ns()
+
+
+def _version(course_id):
+    return cache.get_or_set(f'page:{course_id}:version', _new_version, timeout=None)
+
+
+def _key(course_id, name):
+    return f'page:{course_id}:{_version(course_id)}:{name}'
+
+
+def invalidate_course(course_id):
+    """Сбросить кеш страниц курса. Вызывать после фиксации транзакции (on_commit):
+    иначе параллельный запрос построит значение из старых данных под новой версией"""
+    key = f'page:{course_id}:version'
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключ версии вытеснен - новая версия, не совпадающая ни с одной прежней
+        cache.set(key, _new_version(), timeout=None)
+
+
+def course_outline(course_id):
+    """Уроки курса по порядку (без содержимого)"""
+    return get_or_build(
+        _key(course_id, 'outline'),
+        lambda: tuple(
+            OutlineLesson(*row)
+            for row in Lesson.objects.filter(course_id=course_id)
+            .order_by('order', 'id')
+            .values_list('id', 'course_id', 'title', 'order', 'slot')
+        ),
+        OUTLINE_TIMEOUT
+    )
+
+
+def course_counters(course_id):
+    """Счетчики курса: уроки и комментарии"""
+    return get_or_build(
+        _key(course_id, 'counters'),
+        lambda: {
+            'lessons': Lesson.objects.filter(course_id=course_id).count(),
+            'comments': Comment.objects.filter(course_id=course_id).count(),
+        },
+        OUTLINE_TIMEOUT
+    )
+
+
+def course_sidebar(course_id):
+    """HTML общей для всех части боковой панели: топ рейтинга и рекомендации"""
+
+    def build():
+        return render_to_string('main/course_sidebar.html', {
+            'course_id': course_id,
+            'leaderboard_top': list(leaderboards.top(course_id, per_page=5)),
+            'recommendations': list(
+                CourseRecommendation.objects
+                .filter(course_id=course_id, recommended__deleted_at__isnull=True)
+                .select_related('recommended').order_by('rank')
+            ),
+        })
+
+    return get_or_build(_key(course_id, 'sidebar'), build, SIDEBAR_TIMEOUT)
+
+
+def popular_courses(top=DEFAULT_TOP, days=DEFAULT_DAYS):
+    """id курсов с наибольшей активностью Progress за последние дни"""
+    since = timezone.now() - timedelta(days=days)
+    return list(
+        Progress.objects.filter(updated_at__gte=since, lesson__course__deleted_at__isnull=True)
+        .values('lesson__course_id')
+        .annotate(n=Count('id'))
+        .order_by('-n')
+        .values_list('lesson__course_id', flat=True)[:top]
+    )
+
+
+def warm_course(course_id):
+    try:
+        course_outline(course_id)
+        course_counters(course_id)
+        course_sidebar(course_id)
+    finally:
+        # У каждого потока пула свое соединение с БД
+        connections.close_all()
+
+
+def warm_popular_courses(top=DEFAULT_TOP, days=DEFAULT_DAYS, workers=DEFAULT_WORKERS, force=False):
+    """Заполнить кеш популярных курсов параллельно. Возвращает их id"""
+    course_ids = popular_courses(top, days)
+    if force:
+        for course_id in course_ids:
+            invalidate_course(course_id)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(warm_course, course_ids))
+    return course_ids
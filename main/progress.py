@@ -0,0 +1,205 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import bitmaps
+from .models import CourseProgress, Lesson, Progress, ProgressArchive
+
+
+# Прогресс хранится в трех местах:
+# - Progress: строка на (пользователь, урок), история и аналитика;
+# - ProgressArchive: архивные битовые карты холодного прогресса (см. main/archive.py);
+# - CourseProgress: битовая карта на (пользователь, курс), обновляется при каждой записи.
+# При PROGRESS_BITMAPS = True чтение идет только из CourseProgress (одна маленькая строка),
+# иначе - из Progress и архива. Перед включением заполнить карты командой build_progress_bitmaps.
+# Пакетные читатели (выгрузка, рейтинги, рекомендации, статистика) разворачивают архив
+# через expand_archive.
+
+
+# Повторное переключение той же строки в течение окна считается дублем (двойной клик)
+COALESCE_SECONDS = 2
+
+
+def bitmaps_enabled():
+    return getattr(settings, 'PROGRESS_BITMAPS', False)
+
+
+def _slots_by_course(course_ids):
+    slots = defaultdict(list)
+    for course_id, slot in Lesson.objects.filter(course_id__in=course_ids).values_list('course_id', 'slot'):
+        slots[course_id].append(slot)
+    return slots
+
+
+def _lesson_ids_for_slots(course, slots, lessons=None):
+    if lessons is None:
+        return set(Lesson.objects.filter(course=course, slot__in=slots).values_list('id', flat=True))
+    return {lesson.id for lesson in lessons if lesson.slot in slots}
+
+
+def completed_lesson_ids(user, course, lessons=None):
+    """id завершенных уроков курса. lessons - уже загруженные уроки курса (без лишнего запроса)"""
+    if bitmaps_enabled():
+        bitmap = CourseProgress.objects.filter(user=user, course=course).values_list('completed_slots', flat=True).first()
+        if not bitmap:
+            return set()
+        return _lesson_ids_for_slots(course, set(bitmaps.to_slots(bitmap)), lessons)
+
+    completed = set(
+        Progress.objects.filter(
+            user=user,
+            lesson__course=course,
+            lesson__deleted_at__isnull=True,
+            completed=True
+        ).values_list('lesson_id', flat=True)
+    )
+
+    archived = ProgressArchive.objects.filter(user=user, course=course).values_list('completed_slots', flat=True).first()
+    if archived:
+        completed |= _lesson_ids_for_slots(course, set(bitmaps.to_slots(archived)), lessons)
+
+    return completed
+
+
+def is_completed(user, lesson):
+    """Завершен ли урок пользователем"""
+    if bitmaps_enabled():
+        bitmap = CourseProgress.objects.filter(user=user, course_id=lesson.course_id).values_list('completed_slots', flat=True).first()
+        return bool(bitmap) and bitmaps.has(bitmap, lesson.slot)
+
+    if Progress.objects.filter(user=user, lesson=lesson, completed=True).exists():
+        return True
+    archived = ProgressArchive.objects.filter(user=user, course_id=lesson.course_id).values_list('completed_slots', flat=True).first()
+    return bool(archived) and bitmaps.has(archived, lesson.slot)
+
+
+def _count_bits(bitmaps_by_course):
+    # Биты удаленных уроков не считаем: маска из слотов существующих уроков
+    slots = _slots_by_course(bitmaps_by_course)
+    return {
+        course_id: bitmaps.popcount(bitmap, bitmaps.from_slots(slots.get(course_id, [])))
+        for course_id, bitmap in bitmaps_by_course.items()
+    }
+
+
+def completed_counts(user):
+    """Число завершенных уроков по курсам: {course_id: n}"""
+    if bitmaps_enabled():
+        return _count_bits(dict(
+            CourseProgress.objects.filter(user=user).values_list('course_id', 'completed_slots')
+        ))
+
+    counts = dict(
+        Progress.objects.filter(user=user, completed=True, lesson__deleted_at__isnull=True)
+        .values_list('lesson__course_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+
+    archived = dict(
+        ProgressArchive.objects.filter(user=user).values_list('course_id', 'completed_slots')
+    )
+    for course_id, n in _count_bits(archived).items():
+        counts[course_id] = counts.get(course_id, 0) + n
+
+    return counts
+
+
+def expand_archive(archives, *fields):
+    """Развернуть архивные карты в завершенные уроки: (lesson_id, *fields) на каждый бит.
+    archives - выборка ProgressArchive; биты удаленных уроков пропускаются"""
+    slot_maps = {}
+    rows = (
+        archives.filter(completed_count__gt=0)
+        .order_by('course_id')
+        .values_list('course_id', 'completed_slots', *fields)
+    )
+    for course_id, bitmap, *values in rows.iterator(chunk_size=2000):
+        if course_id not in slot_maps:
+            slot_maps[course_id] = dict(Lesson.objects.filter(course_id=course_id).values_list('slot', 'id'))
+        for slot in bitmaps.to_slots(bitmap):
+            lesson_id = slot_maps[course_id].get(slot)
+            if lesson_id is not None:
+                yield (lesson_id, *values)
+
+
+def claim_toggle(user_id, lesson_id):
+    """True - переключение можно записать; False - эту строку только что переключали"""
+    return cache.add(f'progress:toggle:{user_id}:{lesson_id}', 1, COALESCE_SECONDS)
+
+
+def update_bitmaps(user, changes):
+    """Обновить битовые карты: changes - список (course_id, slot, completed)"""
+    by_course = defaultdict(list)
+    for course_id, slot, completed in changes:
+        by_course[course_id].append((slot, completed))
+
+    with transaction.atomic():
+        for course_id, course_changes in by_course.items():
+            row, created = CourseProgress.objects.select_for_update().get_or_create(user=user, course_id=course_id)
+            bitmap = row.completed_slots
+            for slot, completed in course_changes:
+                bitmap = bitmaps.set_slot(bitmap, slot, completed)
+            row.completed_slots = bitmap
+            row.save()
+
+
+def thaw(user, course_id):
+    """Вернуть архивный прогресс в Progress перед изменением (пользователь снова активен)"""
+    with transaction.atomic():
+        archive = ProgressArchive.objects.select_for_update().filter(user=user, course_id=course_id).first()
+        if archive is None:
+            return False
+
+        slots = bitmaps.to_slots(archive.completed_slots)
+        lesson_ids = list(Lesson.all_objects.filter(course_id=course_id, slot__in=slots).values_list('id', flat=True))
+        started = timezone.now()
+        Progress.objects.bulk_create(
+            [Progress(user=user, lesson_id=lesson_id, completed=True) for lesson_id in lesson_ids],
+            ignore_conflicts=True
+        )
+        # Восстановленным строкам - исходные даты, а не время разархивации
+        Progress.objects.filter(user=user, lesson_id__in=lesson_ids, started_at__gte=started).update(
+            started_at=archive.started_at,
+            updated_at=archive.last_activity,
+            changed_at=archive.last_activity
+        )
+        archive.delete()
+    return True
+
+
+def build_bitmaps(batch_size=1000):
+    """Заполнить CourseProgress из Progress и архива (переход на PROGRESS_BITMAPS)"""
+    pairs = defaultdict(int)
+
+    rows = (
+        Progress.objects.filter(completed=True)
+        .values_list('user_id', 'lesson__course_id', 'lesson__slot')
+        .order_by()
+        .iterator(chunk_size=5000)
+    )
+    for user_id, course_id, slot in rows:
+        pairs[user_id, course_id] |= 1 << slot
+
+    archived = ProgressArchive.objects.values_list('user_id', 'course_id', 'completed_slots').iterator(chunk_size=5000)
+    for user_id, course_id, bitmap in archived:
+        pairs[user_id, course_id] |= bitmaps.to_int(bitmap)
+
+    objects = [
+        CourseProgress(user_id=user_id, course_id=course_id, completed_slots=bitmaps.from_int(value))
+        for (user_id, course_id), value in pairs.items()
+    ]
+    with transaction.atomic():
+        CourseProgress.objects.update(completed_slots=b'')
+        CourseProgress.objects.bulk_create(
+            objects,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'course'],
+            update_fields=['completed_slots', 'updated_at']
+        )
+    return len(objects)
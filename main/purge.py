@@ -0,0 +1,213 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import autocomplete, bitmaps, blobstore, pagecache
+from .models import (
+    Comment, Course, CourseDailyStats, CourseProgress, CourseRecommendation, DeletionJob,
+    LeaderboardEntry, Lesson, LessonDailyStats, LessonRevision, LessonSection, Progress, ProgressArchive
+)
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def soft_delete_course(course, author):
+    """Скрыть курс и его уроки и поставить удаление в очередь"""
+    now = timezone.now()
+    with transaction.atomic():
+        Course.objects.filter(pk=course.pk).update(deleted_at=now)
+        Lesson.objects.filter(course=course).update(deleted_at=now)
+        transaction.on_commit(lambda: autocomplete.update('course', course.pk))
+        transaction.on_commit(lambda: pagecache.invalidate_course(course.pk))
+        # Курс пропадает и из рекомендаций в боковых панелях других курсов
+        for course_id in CourseRecommendation.objects.filter(recommended=course).values_list('course_id', flat=True):
+            transaction.on_commit(lambda course_id=course_id: pagecache.invalidate_course(course_id))
+        return DeletionJob.objects.create(
+            author=author,
+            kind='course',
+            object_id=course.pk,
+            name=course.name[:200]
+        )
+
+
+def soft_delete_lesson(lesson, author):
+    """Скрыть урок и поставить удаление в очередь"""
+    with transaction.atomic():
+        Lesson.objects.filter(pk=lesson.pk).update(deleted_at=timezone.now())
+        transaction.on_commit(lambda: autocomplete.update('lesson', lesson.pk))
+        transaction.on_commit(lambda: pagecache.invalidate_course(lesson.course_id))
+        return DeletionJob.objects.create(
+            author=author,
+            kind='lesson',
+            object_id=lesson.pk,
+            name=lesson.title[:200]
+        )
+
+
+def _delete_in_batches(queryset, job, batch_size, before_delete=None):
+    """Удалять строки пачками по первичному ключу, обновляя счетчик задачи"""
+    model = queryset.model
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            batch = model._base_manager.filter(pk__in=ids)
+            if before_delete:
+                before_delete(batch)
+            deleted = batch.delete()[0]
+            DeletionJob.objects.filter(pk=job.pk).update(deleted_rows=F('deleted_rows') + deleted)
+
+
+def _unscore_users(course_id, by_count):
+    """Снять очки в рейтинге курса и общем: by_count - {число уроков: [user_id]}"""
+    for n, user_ids in by_count.items():
+        LeaderboardEntry.objects.filter(
+            Q(course_id=course_id) | Q(course__isnull=True),
+            user_id__in=user_ids
+        ).update(lessons_completed=Greatest(F('lessons_completed') - n, 0))
+
+
+def _unscore(course_id):
+    """Перед удалением завершенного прогресса уменьшить очки в рейтингах"""
+
+    def adjust(batch):
+        # У пользователя в пачке может быть несколько завершенных уроков:
+        # одно обновление на каждое различное их число
+        by_count = defaultdict(list)
+        for user_id, n in batch.filter(completed=True).values_list('user_id').annotate(n=Count('id')).order_by():
+            by_count[n].append(user_id)
+        _unscore_users(course_id, by_count)
+
+    return adjust
+
+
+def _clear_slots(course_id, slots, batch_size):
+    """Снять биты удаляемых уроков в картах прогресса. После удаления урока его слот
+    может достаться новому уроку курса (слот - следующий за максимальным)"""
+    mask = bitmaps.to_int(bitmaps.from_slots(slots))
+    if not mask:
+        return
+
+    for model in (CourseProgress, ProgressArchive):
+        archive = model is ProgressArchive
+        rows = model.objects.filter(course_id=course_id).order_by('pk').values_list('pk', 'user_id', 'completed_slots')
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+
+                changed = []
+                unscored = defaultdict(list)
+                for pk, user_id, bitmap in batch:
+                    value = bitmaps.to_int(bitmap)
+                    if not value & mask:
+                        continue
+                    row = model(pk=pk, completed_slots=bitmaps.from_int(value & ~mask))
+                    if archive:
+                        row.completed_count = bitmaps.popcount(row.completed_slots)
+                        unscored[bin(value & mask).count('1')].append(user_id)
+                    changed.append(row)
+
+                fields = ['completed_slots', 'completed_count'] if archive else ['completed_slots']
+                model.objects.bulk_update(changed, fields)
+                # Архивные завершения учтены в рейтингах, как и строки Progress
+                _unscore_users(course_id, unscored)
+
+
+def _purge_lessons(lessons, course_id, job, batch_size):
+    """Удалить уроки вместе с прогрессом, разделами, статистикой и файлами"""
+    lesson_ids = lessons.values_list('pk', flat=True)
+    _delete_in_batches(
+        Progress.objects.filter(lesson_id__in=lesson_ids),
+        job, batch_size, before_delete=_unscore(course_id)
+    )
+    _delete_in_batches(LessonSection.objects.filter(lesson_id__in=lesson_ids), job, batch_size)
+    _delete_in_batches(LessonDailyStats.objects.filter(lesson_id__in=lesson_ids), job, batch_size)
+    _delete_in_batches(LessonRevision.objects.filter(lesson_id__in=lesson_ids), job, batch_size)
+    _clear_slots(course_id, lessons.values_list('slot', flat=True), batch_size)
+
+    def delete_files(batch):
+        names = [name for name in batch.values_list('file', flat=True) if name]
+        # Блобы могут быть общими с другими уроками: снимаем ссылки, удалит gc_blobs
+        blobstore.release(names)
+        legacy = [name for name in names if not blobstore.is_blob(name)]
+        storage = Lesson._meta.get_field('file').storage
+        # Файлы удаляются только после фиксации транзакции
+        transaction.on_commit(lambda: [storage.delete(name) for name in legacy])
+
+    _delete_in_batches(lessons, job, batch_size, before_delete=delete_files)
+
+
+def count_rows(job):
+    """Сколько строк удалит задача (для отображения прогресса)"""
+    if job.kind == 'course':
+        lessons = Lesson.all_objects.filter(course_id=job.object_id)
+        return (
+            Progress.objects.filter(lesson__course_id=job.object_id).count() +
+            LessonSection.objects.filter(lesson__course_id=job.object_id).count() +
+            LessonDailyStats.objects.filter(course_id=job.object_id).count() +
+            LessonRevision.objects.filter(lesson__course_id=job.object_id).count() +
+            Comment.objects.filter(course_id=job.object_id).count() +
+            LeaderboardEntry.objects.filter(course_id=job.object_id).count() +
+            CourseProgress.objects.filter(course_id=job.object_id).count() +
+            ProgressArchive.objects.filter(course_id=job.object_id).count() +
+            lessons.count() + 1
+        )
+    return (
+        Progress.objects.filter(lesson_id=job.object_id).count() +
+        LessonSection.objects.filter(lesson_id=job.object_id).count() +
+        LessonDailyStats.objects.filter(lesson_id=job.object_id).count() +
+        LessonRevision.objects.filter(lesson_id=job.object_id).count() + 1
+    )
+
+
+def run_job(job, batch_size=DEFAULT_BATCH_SIZE):
+    """Выполнить задачу удаления"""
+    job.status = 'running'
+    job.total_rows = count_rows(job)
+    job.save(update_fields=['status', 'total_rows'])
+
+    try:
+        if job.kind == 'course':
+            course_id = job.object_id
+            _purge_lessons(Lesson.all_objects.filter(course_id=course_id), course_id, job, batch_size)
+            _delete_in_batches(Comment.objects.filter(course_id=course_id), job, batch_size)
+            CourseDailyStats.objects.filter(course_id=course_id).delete()
+            CourseRecommendation.objects.filter(Q(course_id=course_id) | Q(recommended_id=course_id)).delete()
+            _delete_in_batches(LeaderboardEntry.objects.filter(course_id=course_id), job, batch_size)
+            _delete_in_batches(CourseProgress.objects.filter(course_id=course_id), job, batch_size)
+            _delete_in_batches(ProgressArchive.objects.filter(course_id=course_id), job, batch_size)
+            _delete_in_batches(Course.all_objects.filter(pk=course_id), job, batch_size)
+        else:
+            lessons = Lesson.all_objects.filter(pk=job.object_id)
+            course_id = lessons.values_list('course_id', flat=True).first()
+            _purge_lessons(lessons, course_id, job, batch_size)
+    except Exception as e:
+        DeletionJob.objects.filter(pk=job.pk).update(status='failed', error=str(e))
+        raise
+
+    DeletionJob.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+
+
+def run_pending(batch_size=DEFAULT_BATCH_SIZE, limit=None):
+    """Выполнить задачи из очереди. Возвращает число выполненных"""
+    jobs = DeletionJob.objects.filter(status='pending').order_by('created_at')
+    if limit:
+        jobs = jobs[:limit]
+
+    done = 0
+    for job in jobs:
+        # Задачу может забрать другой воркер
+        if not DeletionJob.objects.filter(pk=job.pk, status='pending').update(status='running'):
+            continue
+        run_job(job, batch_size)
+        done += 1
+    return done
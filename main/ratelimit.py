@@ -0,0 +1,84 @@
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+
+# Token bucket в общем кеше: ведро на (область, пользователь), для анонимов - на (область, IP).
+# Ведро вмещает burst запросов и пополняется со скоростью rate в секунду.
+# Лимиты задаются в settings.RATE_LIMITS.
+# Проверка не атомарна между процессами: при гонке пройдет лишний запрос-другой,
+# для защиты от всплесков этого достаточно.
+
+def _limits(scope):
+    per_minute, burst = settings.RATE_LIMITS[scope]
+    return per_minute / 60, burst
+
+
+def take(key, rate, burst):
+    """Взять токен из ведра. Возвращает (разрешено, через сколько секунд повторить)"""
+    now = time.time()
+    tokens, updated = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+
+    # Ведро хранится, пока не наполнится заново
+    timeout = math.ceil(burst / rate) + 1
+    if tokens < 1:
+        cache.set(key, (tokens, now), timeout)
+        return False, math.ceil((1 - tokens) / rate)
+    cache.set(key, (tokens - 1, now), timeout)
+    return True, 0
+
+
+def client_ip(request):
+    """IP клиента. За обратным прокси - из его заголовка (RATE_LIMIT_IP_HEADER):
+    берется адрес, добавленный ближайшим из RATE_LIMIT_TRUSTED_PROXIES доверенных прокси"""
+    header = getattr(settings, 'RATE_LIMIT_IP_HEADER', None)
+    if header:
+        chain = [ip.strip() for ip in request.META.get(header, '').split(',') if ip.strip()]
+        proxies = getattr(settings, 'RATE_LIMIT_TRUSTED_PROXIES', 1)
+        if len(chain) >= proxies:
+            return chain[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check(request, scope):
+    """Проверить ведро пользователя (анонима - по IP). Возвращает 0 или секунды до повтора"""
+    rate, burst = _limits(scope)
+    # Вошедших не ограничиваем по IP: за NAT класса или прокси у всех один адрес
+    if request.user.is_authenticated:
+        key = f'ratelimit:{scope}:user:{request.user.pk}'
+    else:
+        key = f'ratelimit:{scope}:ip:{client_ip(request)}'
+
+    allowed, wait = take(key, rate, burst)
+    return 0 if allowed else wait
+
+
+def too_many_requests(request, retry_after):
+    message = f'Слишком много запросов. Повторите через {retry_after} с.'
+    if request.path.startswith('/api/'):
+        response = JsonResponse({'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, methods=('POST',)):
+    """Декоратор представления: 429 при исчерпании ведра (methods=None - любой метод)"""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                retry_after = check(request, scope)
+                if retry_after:
+                    return too_many_requests(request, retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+
+    return decorator
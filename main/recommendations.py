@@ -0,0 +1,145 @@
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import CourseRecommendation, Progress, ProgressArchive, Watermark
+
+
+WATERMARK_NAME = 'course_recommendations'
+DEFAULT_TOP_K = 5
+
+
+def learner_courses(user_ids=None, chunk_size=5000):
+    """Множество пройденных курсов каждого ученика (курс считается начатым после первого завершенного урока)"""
+    rows = Progress.objects.filter(completed=True)
+    # Архивный прогресс неактивных учеников - пары (ученик, курс) с завершенными уроками
+    archived = ProgressArchive.objects.filter(completed_count__gt=0)
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+        archived = archived.filter(user_id__in=user_ids)
+
+    courses = defaultdict(set)
+    pairs = (
+        rows.values_list('user_id', 'lesson__course_id')
+        .order_by()
+        .distinct()
+        .iterator(chunk_size=chunk_size)
+    )
+    for user_id, course_id in pairs:
+        courses[user_id].add(course_id)
+    for user_id, course_id in archived.values_list('user_id', 'course_id').iterator(chunk_size=chunk_size):
+        courses[user_id].add(course_id)
+    return courses
+
+
+def course_popularity():
+    """Число учеников каждого курса"""
+    popularity = Counter(dict(
+        Progress.objects.filter(completed=True)
+        .values_list('lesson__course_id')
+        .annotate(n=Count('user_id', distinct=True))
+        .order_by()
+    ))
+    # Пара (ученик, курс) либо в Progress, либо в архиве: изменение прогресса сначала размораживает архив
+    popularity.update(dict(
+        ProgressArchive.objects.filter(completed_count__gt=0)
+        .values_list('course_id')
+        .annotate(n=Count('user_id'))
+        .order_by()
+    ))
+    return dict(popularity)
+
+
+def cooccurrence(course_sets, rows=None):
+    """Разреженная матрица курс x курс: {a: Counter({b: сколько учеников прошли оба})}
+
+    rows ограничивает пересчет строками только этих курсов.
+    """
+    matrix = defaultdict(Counter)
+    for courses in course_sets:
+        if len(courses) < 2:
+            continue
+        for a in courses:
+            if rows is not None and a not in rows:
+                continue
+            row = matrix[a]
+            for b in courses:
+                if b != a:
+                    row[b] += 1
+    return matrix
+
+
+def top_neighbours(matrix, popularity, top_k=DEFAULT_TOP_K):
+    """Top-K соседей по косинусной близости: |A∩B| / sqrt(|A|·|B|)"""
+    result = {}
+    for a, row in matrix.items():
+        scored = [
+            (count / math.sqrt(popularity.get(a, 1) * popularity.get(b, 1)), b)
+            for b, count in row.items()
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        result[a] = scored[:top_k]
+    return result
+
+
+def store_neighbours(neighbours, course_ids=None):
+    """Заменить рекомендации для course_ids (None - для всех курсов)"""
+    objects = [
+        CourseRecommendation(course_id=a, recommended_id=b, rank=rank, score=score)
+        for a, scored in neighbours.items()
+        for rank, (score, b) in enumerate(scored, start=1)
+    ]
+    stale = CourseRecommendation.objects.all()
+    if course_ids is not None:
+        stale = stale.filter(course_id__in=course_ids)
+
+    with transaction.atomic():
+        stale.delete()
+        CourseRecommendation.objects.bulk_create(objects, batch_size=1000)
+
+
+def refresh_recommendations(full=False, top_k=DEFAULT_TOP_K):
+    """Пересчитать рекомендации. Без full - только для курсов учеников, чей прогресс менялся"""
+    started = timezone.now()
+    watermark, created = Watermark.objects.get_or_create(name=WATERMARK_NAME)
+
+    if full or watermark.value is None:
+        sets = learner_courses()
+        affected = None
+    else:
+        changed_users = (
+            Progress.objects.filter(updated_at__gte=watermark.value)
+            .values_list('user_id', flat=True)
+        )
+        affected = set()
+        for courses in learner_courses(changed_users).values():
+            affected |= courses
+        if not affected:
+            sets = {}
+        else:
+            # Для строк затронутых курсов нужны все их ученики, а не только изменившиеся
+            learners = (
+                Progress.objects.filter(completed=True, lesson__course_id__in=affected)
+                .values_list('user_id', flat=True)
+            )
+            sets = learner_courses(learners)
+            archived_learners = (
+                ProgressArchive.objects.filter(completed_count__gt=0, course_id__in=affected)
+                .values_list('user_id', flat=True)
+            )
+            for user_id, courses in learner_courses(archived_learners).items():
+                sets[user_id] |= courses
+
+    matrix = cooccurrence(sets.values(), rows=affected)
+    neighbours = top_neighbours(matrix, course_popularity(), top_k)
+
+    if affected is None or affected:
+        store_neighbours(neighbours, affected)
+
+    watermark.value = started
+    watermark.save(update_fields=['value'])
+
+    return len(neighbours)
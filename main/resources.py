@@ -0,0 +1,186 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import DateTimeField, Prefetch, Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Course, Lesson
+
+
+# Описание ресурсов JSON API (только чтение, см. main/api.py).
+# Поле: имя -> (колонки модели, функция значения). По колонкам строится only(),
+# поэтому не запрошенные description/content из БД не читаются.
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def _user(user):
+    return {'id': user.id, 'username': user.username}
+
+
+def _category(course):
+    # Название из реестра категорий - без запроса к БД
+    return {'id': course.category_id, 'name': course.category_name}
+
+
+COURSE_FIELDS = {
+    'id': ((), lambda c: c.id),
+    'name': (('name',), lambda c: c.name),
+    'description': (('description',), lambda c: c.description),
+    'category': (('category_id',), _category),
+    'author': (('author_id',), lambda c: c.author_id),
+    'created_at': (('created_at',), lambda c: c.created_at),
+    'updated_at': (('updated_at',), lambda c: c.updated_at),
+}
+
+LESSON_FIELDS = {
+    'id': ((), lambda lesson: lesson.id),
+    'course': (('course_id',), lambda lesson: lesson.course_id),
+    'title': (('title',), lambda lesson: lesson.title),
+    'description': (('description',), lambda lesson: lesson.description),
+    'order': (('order',), lambda lesson: lesson.order),
+    'file': (('file',), lambda lesson: lesson.file.url if lesson.file else None),
+    'created_at': (('created_at',), lambda lesson: lesson.created_at),
+    'updated_at': (('updated_at',), lambda lesson: lesson.updated_at),
+}
+
+COMMENT_FIELDS = {
+    'id': ((), lambda c: c.id),
+    'course': (('course_id',), lambda c: c.course_id),
+    'author': (('author_id',), lambda c: c.author_id),
+    'text': (('text',), lambda c: c.text),
+    'created_at': (('created_at',), lambda c: c.created_at),
+    'updated_at': (('updated_at',), lambda c: c.updated_at),
+}
+
+DEFAULT_COURSE_FIELDS = ['id', 'name', 'category', 'author', 'created_at']
+DEFAULT_LESSON_FIELDS = ['id', 'course', 'title', 'order']
+DEFAULT_COMMENT_FIELDS = ['id', 'author', 'text', 'created_at']
+
+
+def parse_fields(request, name, spec, default):
+    """Поля из ?fields= (основной ресурс) или ?fields[name]= (вложенный)"""
+    raw = request.GET.get(name)
+    if raw is None:
+        return default
+    fields = [field for field in raw.split(',') if field]
+    unknown = sorted(set(fields) - set(spec))
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+    return ['id'] + [field for field in dict.fromkeys(fields) if field != 'id']
+
+
+def parse_include(request, allowed):
+    include = [name for name in request.GET.get('include', '').split(',') if name]
+    unknown = sorted(set(include) - set(allowed))
+    if unknown:
+        raise ValueError(f'Нельзя включить: {", ".join(unknown)}')
+    return set(include)
+
+
+def columns(spec, fields, *extra):
+    names = ['id', *extra]
+    for field in fields:
+        names.extend(spec[field][0])
+    return list(dict.fromkeys(names))
+
+
+def serialize(obj, spec, fields):
+    return {field: spec[field][1](obj) for field in fields}
+
+
+def course_queryset(course_fields, include, lesson_fields=None):
+    """Курсы с нужными колонками; author и lessons подтягиваются фиксированным числом запросов"""
+    queryset = Course.objects.only(*columns(COURSE_FIELDS, course_fields, 'created_at'))
+    if 'author' in include:
+        queryset = queryset.select_related('author').only(
+            *columns(COURSE_FIELDS, course_fields, 'created_at', 'author_id'),
+            'author__id', 'author__username'
+        )
+    if 'lessons' in include:
+        queryset = queryset.prefetch_related(Prefetch(
+            'lessons',
+            queryset=Lesson.objects.only(*columns(LESSON_FIELDS, lesson_fields, 'course_id', 'order')).order_by('order', 'id')
+        ))
+    return queryset
+
+
+def serialize_course(course, course_fields, include, lesson_fields=None):
+    data = serialize(course, COURSE_FIELDS, course_fields)
+    if 'author' in include:
+        data['author'] = _user(course.author)
+    if 'lessons' in include:
+        data['lessons'] = [serialize(lesson, LESSON_FIELDS, lesson_fields) for lesson in course.lessons.all()]
+    return data
+
+
+def lesson_queryset(lesson_fields):
+    return Lesson.objects.only(*columns(LESSON_FIELDS, lesson_fields, 'course_id', 'order'))
+
+
+def comment_queryset(comment_fields, include):
+    queryset = Comment.objects.only(*columns(COMMENT_FIELDS, comment_fields, 'created_at'))
+    if 'author' in include:
+        queryset = queryset.select_related('author').only(
+            *columns(COMMENT_FIELDS, comment_fields, 'created_at', 'author_id'),
+            'author__id', 'author__username'
+        )
+    return queryset
+
+
+def serialize_comment(comment, comment_fields, include):
+    data = serialize(comment, COMMENT_FIELDS, comment_fields)
+    if 'author' in include:
+        data['author'] = _user(comment.author)
+    return data
+
+
+def _encode_cursor(value, pk):
+    # isoformat сохраняет микросекунды (DjangoJSONEncoder округляет до миллисекунд)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, field):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if isinstance(field, DateTimeField):
+            value = parse_datetime(value)
+        if value is None or not isinstance(pk, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError('Неверный cursor')
+    return value, pk
+
+
+def paginate(request, queryset, order_field, descending=False):
+    """Страница по курсору: (объекты, курсор следующей страницы или None)
+
+    Курсор - значение поля сортировки и id последнего объекта, поэтому
+    выборка не зависит от глубины страницы (без OFFSET).
+    """
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError('limit должен быть числом')
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    lookup = 'lt' if descending else 'gt'
+    cursor = request.GET.get('cursor')
+    if cursor:
+        value, pk = _decode_cursor(cursor, queryset.model._meta.get_field(order_field))
+        queryset = queryset.filter(
+            Q(**{f'{order_field}__{lookup}': value}) |
+            Q(**{order_field: value, f'pk__{lookup}': pk})
+        )
+
+    prefix = '-' if descending else ''
+    items = list(queryset.order_by(prefix + order_field, prefix + 'pk')[:limit + 1])
+    if len(items) <= limit:
+        return items, None
+    last = items[limit - 1]
+    return items[:limit], _encode_cursor(getattr(last, order_field), last.pk)
@@ -0,0 +1,124 @@
+import difflib
+import json
+import zlib
+
+from django.db import transaction
+
+from .content import content_hash
+from .models import LessonRevision
+
+
+# История текста урока. Каждое сохранение - сжатая правка к предыдущей версии
+# (неизменные диапазоны строк + вставленный текст), поэтому история растет
+# на размер правки, а не урока. Каждая SNAPSHOT_EVERY-я версия - полный снимок:
+# любая версия восстанавливается из снимка и не более SNAPSHOT_EVERY - 1 правок.
+
+SNAPSHOT_EVERY = 20
+COMPRESS_LEVEL = 6
+DIFF_CONTEXT = 3
+
+
+def _lines(text):
+    return (text or '').splitlines(keepends=True)
+
+
+def _compress(text):
+    return zlib.compress(text.encode('utf-8'), COMPRESS_LEVEL)
+
+
+def _decompress(data):
+    return zlib.decompress(bytes(data)).decode('utf-8')
+
+
+def make_delta(old, new):
+    """Правка old -> new: [начало, конец] - строки old без изменений, строка - вставленный текст"""
+    a, b = _lines(old), _lines(new)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(b[j1:j2]))
+    return ops
+
+
+def apply_delta(old, ops):
+    a = _lines(old)
+    return ''.join(''.join(a[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+
+def content_at(revision):
+    """Текст версии: ближайший снимок и правки после него"""
+    chain = (
+        LessonRevision.objects
+        .filter(lesson_id=revision.lesson_id, number__range=(revision.base_number, revision.number))
+        .order_by('number')
+        .values_list('is_snapshot', 'data')
+    )
+    text = ''
+    for is_snapshot, data in chain:
+        payload = _decompress(data)
+        text = payload if is_snapshot else apply_delta(text, json.loads(payload))
+    return text
+
+
+def _create(lesson_id, number, text, author, message, base_number=None, data=None):
+    is_snapshot = base_number is None
+    return LessonRevision.objects.create(
+        lesson_id=lesson_id,
+        number=number,
+        base_number=number if is_snapshot else base_number,
+        is_snapshot=is_snapshot,
+        data=_compress(text) if data is None else data,
+        content_hash=content_hash(text),
+        content_size=len(text),
+        author=author,
+        message=message[:200]
+    )
+
+
+def record(lesson, author=None, previous=None, message=''):
+    """Записать текущий текст урока как новую версию. previous - текст до правки:
+    без него правка считается от восстановленной последней версии.
+    Возвращает версию или None, если текст не изменился"""
+    text = lesson.content or ''
+    digest = content_hash(text)
+    with transaction.atomic():
+        last = LessonRevision.objects.filter(lesson_id=lesson.pk).order_by('-number').first()
+        if last is None and previous is not None and previous != text:
+            # Урок создан до истории версий - сначала сохраняем исходный текст
+            last = _create(lesson.pk, 1, previous, None, 'Исходная версия')
+        if last is not None and last.content_hash == digest:
+            return None
+
+        number = last.number + 1 if last else 1
+        if last is None or number - last.base_number >= SNAPSHOT_EVERY:
+            return _create(lesson.pk, number, text, author, message)
+
+        if previous is None or content_hash(previous) != last.content_hash:
+            previous = content_at(last)
+        delta = _compress(json.dumps(make_delta(previous, text), ensure_ascii=False, separators=(',', ':')))
+        snapshot = _compress(text)
+        if len(snapshot) <= len(delta):
+            # Текст переписан почти целиком - снимок не больше правки и обрывает цепочку
+            return _create(lesson.pk, number, text, author, message, data=snapshot)
+        return _create(lesson.pk, number, text, author, message, base_number=last.base_number, data=delta)
+
+
+def diff(old, new, context=DIFF_CONTEXT):
+    """Строки unified diff с видом для подсветки: [(вид, текст)]"""
+    lines = difflib.unified_diff(_lines(old), _lines(new), n=context)
+    result = []
+    for line in list(lines)[2:]:
+        kind = {'@': 'hunk', '+': 'add', '-': 'del'}.get(line[:1], 'same')
+        result.append((kind, line.rstrip('\r\n')))
+    return result
+
+
+def rollback(lesson, revision, author):
+    """Вернуть текст урока к версии. Откат сам записывается новой версией"""
+    with transaction.atomic():
+        previous = lesson.content
+        lesson.content = content_at(revision)
+        lesson.save(update_fields=['content', 'updated_at'])
+        return record(lesson, author, previous, f'Откат к версии {revision.number}')
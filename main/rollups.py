@@ -0,0 +1,215 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import progress as progress_store
+from .models import Comment, CourseDailyStats, Lesson, LessonDailyStats, Progress, ProgressArchive, Watermark
+
+
+WATERMARK_NAME = 'course_daily_stats'
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def touched_days(since=None):
+    """Дни с изменениями после since: {день: {course_id: полный ли пересчет}}.
+    День, попавший только через started_at, пересчитывается частично - см. rebuild_new_learners"""
+    progress = Progress.objects.all()
+    comments = Comment.objects.all()
+    if since is not None:
+        progress = progress.filter(updated_at__gte=since)
+        comments = comments.filter(created_at__gte=since)
+
+    touched = defaultdict(dict)
+
+    def add(rows, full=True):
+        for day, course_id in rows:
+            touched[day][course_id] = touched[day].get(course_id, False) or full
+
+    def days(queryset, field, course_field):
+        return (
+            queryset
+            .annotate(day=TruncDate(field))
+            .values_list('day', course_field)
+            .order_by()
+            .distinct()
+        )
+
+    add(days(progress, 'updated_at', 'lesson__course_id'))
+    add(days(comments, 'created_at', 'course_id'))
+    # День начала урока, обновленного позже: завершения и активность того дня
+    # по текущему updated_at уже не восстановить, меняются только новые ученики
+    add(days(progress, 'started_at', 'lesson__course_id'), full=since is None)
+
+    if since is None:
+        # Полный пересчет: дни, в которых был прогресс, ушедший в архив
+        for field in ('started_at', 'last_activity'):
+            add(days(ProgressArchive.objects.all(), field, 'course_id'))
+
+    return touched
+
+
+def _new_learners(start, end, course_ids):
+    """Ученики, чей первый прогресс в курсе пришелся на [start, end)"""
+    earlier = Progress.objects.filter(
+        user_id=OuterRef('user_id'),
+        lesson__course_id=OuterRef('lesson__course_id'),
+        started_at__lt=start
+    )
+    counts = dict(
+        Progress.objects.filter(
+            started_at__gte=start,
+            started_at__lt=end,
+            lesson__course_id__in=course_ids
+        )
+        .exclude(Exists(earlier))
+        .values_list('lesson__course_id')
+        .annotate(n=Count('user_id', distinct=True))
+    )
+    # Архив хранит только начало по курсу: ученик - новый в день начала
+    archived = ProgressArchive.objects.filter(
+        course_id__in=course_ids,
+        started_at__gte=start,
+        started_at__lt=end
+    )
+    for course_id, n in archived.values_list('course_id').annotate(n=Count('id')).order_by():
+        counts[course_id] = counts.get(course_id, 0) + n
+    return counts
+
+
+def rebuild_new_learners(day, course_ids):
+    """Обновить за день только число новых учеников, не трогая остальные счетчики"""
+    start, end = _day_bounds(day)
+    course_ids = list(course_ids)
+    counts = _new_learners(start, end, course_ids)
+    with transaction.atomic():
+        for course_id in course_ids:
+            CourseDailyStats.objects.update_or_create(
+                course_id=course_id,
+                date=day,
+                defaults={'new_learners': counts.get(course_id, 0)}
+            )
+
+
+def rebuild_day(day, course_ids):
+    """Пересчитать статистику за день для указанных курсов"""
+    start, end = _day_bounds(day)
+    course_ids = list(course_ids)
+
+    updated = Progress.objects.filter(
+        updated_at__gte=start,
+        updated_at__lt=end,
+        lesson__course_id__in=course_ids
+    )
+
+    lesson_completions = (
+        updated.filter(completed=True)
+        .values_list('lesson__course_id', 'lesson_id')
+        .annotate(n=Count('id'))
+    )
+
+    active_users = dict(
+        updated.values_list('lesson__course_id')
+        .annotate(n=Count('user_id', distinct=True))
+    )
+
+    new_learners = _new_learners(start, end, course_ids)
+
+    comments = dict(
+        Comment.objects.filter(
+            created_at__gte=start,
+            created_at__lt=end,
+            course_id__in=course_ids
+        )
+        .values_list('course_id')
+        .annotate(n=Count('id'))
+    )
+
+    # Архивный ученик - активный и завершивший свои уроки в день последней активности
+    archived_last = ProgressArchive.objects.filter(
+        course_id__in=course_ids,
+        last_activity__gte=start,
+        last_activity__lt=end
+    )
+    for course_id, n in archived_last.values_list('course_id').annotate(n=Count('id')).order_by():
+        active_users[course_id] = active_users.get(course_id, 0) + n
+
+    by_lesson = defaultdict(int)
+    for course_id, lesson_id, n in lesson_completions:
+        by_lesson[course_id, lesson_id] += n
+    for lesson_id, course_id in progress_store.expand_archive(archived_last, 'course_id'):
+        by_lesson[course_id, lesson_id] += 1
+
+    lessons = {
+        lesson_id: (order, title)
+        for lesson_id, order, title in Lesson.all_objects
+        .filter(id__in=[lesson_id for course_id, lesson_id in by_lesson])
+        .values_list('id', 'order', 'title')
+    }
+
+    completions = defaultdict(int)
+    lesson_rows = []
+    for (course_id, lesson_id), n in by_lesson.items():
+        completions[course_id] += n
+        order, title = lessons[lesson_id]
+        lesson_rows.append(LessonDailyStats(
+            lesson_id=lesson_id,
+            course_id=course_id,
+            date=day,
+            completions=n,
+            lesson_order=order,
+            lesson_title=title
+        ))
+
+    course_rows = [
+        CourseDailyStats(
+            course_id=course_id,
+            date=day,
+            new_learners=new_learners.get(course_id, 0),
+            completions=completions.get(course_id, 0),
+            comments=comments.get(course_id, 0),
+            active_users=active_users.get(course_id, 0)
+        )
+        for course_id in course_ids
+    ]
+
+    # Пересчет идемпотентный: день целиком заменяется новыми значениями
+    with transaction.atomic():
+        CourseDailyStats.objects.filter(date=day, course_id__in=course_ids).delete()
+        LessonDailyStats.objects.filter(date=day, course_id__in=course_ids).delete()
+        CourseDailyStats.objects.bulk_create(course_rows)
+        LessonDailyStats.objects.bulk_create(lesson_rows)
+
+
+def refresh_rollups(backfill=False, since=None):
+    """Инкрементально обновить статистику с последней отметки. Возвращает число дней"""
+    started = timezone.now()
+    watermark, created = Watermark.objects.get_or_create(name=WATERMARK_NAME)
+
+    # При backfill отметка игнорируется и пересчитывается вся история (или с since)
+    if since is None and not backfill:
+        since = watermark.value
+
+    touched = touched_days(since)
+    for day in sorted(touched):
+        courses = touched[day]
+        full = [course_id for course_id, is_full in courses.items() if is_full]
+        partial = [course_id for course_id, is_full in courses.items() if not is_full]
+        if full:
+            rebuild_day(day, full)
+        if partial:
+            rebuild_new_learners(day, partial)
+
+    # Отметка ставится на момент начала, чтобы не потерять записи, пришедшие во время пересчета
+    if watermark.value is None or started > watermark.value:
+        watermark.value = started
+        watermark.save(update_fields=['value'])
+
+    return len(touched)
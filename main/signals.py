@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, blobstore, categories, events, pagecache
+from .auth import invalidate_user
+from .models import Category, Comment, Course, Lesson, LessonDailyStats, UserProfile
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Смена пароля, имени и т.д. - кешированный пользователь устарел
+    invalidate_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    categories.invalidate()
+
+
+# Удаление (мягкое и окончательное) обновляет индекс и кеш страниц в main/purge.py:
+# обработчик post_delete замедлил бы пакетное удаление уроков
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, **kwargs):
+    autocomplete.update('course', instance.pk, instance.name, instance.pk)
+    transaction.on_commit(lambda: pagecache.invalidate_course(instance.pk))
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, **kwargs):
+    autocomplete.update('lesson', instance.pk, instance.title, instance.course_id)
+    transaction.on_commit(lambda: pagecache.invalidate_course(instance.course_id))
+    # Копия названия и порядка в статистике (только если изменились)
+    LessonDailyStats.objects.filter(lesson=instance).exclude(
+        lesson_order=instance.order, lesson_title=instance.title
+    ).update(lesson_order=instance.order, lesson_title=instance.title)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: pagecache.invalidate_course(instance.course_id))
+        transaction.on_commit(lambda: events.publish_comment(instance))
+
+
+# Счетчики ссылок на файлы хранилища: имя файла запоминается при загрузке
+# объекта и сравнивается после сохранения. Окончательное удаление уроков
+# снимает ссылки в main/purge.py, прочие пропуски исправляет gc_blobs
+@receiver(post_init, sender=Lesson)
+def lesson_loaded(sender, instance, **kwargs):
+    blobstore.remember(instance, 'file')
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_file_saved(sender, instance, created, **kwargs):
+    blobstore.sync(instance, created, 'file')
+
+
+@receiver(post_init, sender=UserProfile)
+def profile_loaded(sender, instance, **kwargs):
+    blobstore.remember(instance, 'avatar')
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_avatar_saved(sender, instance, created, **kwargs):
+    blobstore.sync(instance, created, 'avatar')
+
+
+@receiver(post_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    blobstore.release([blobstore.remembered(instance, 'avatar')])
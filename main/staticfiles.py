@@ -0,0 +1,98 @@
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен: без него остаются только .gz
+    brotli = None
+
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.json', '.map', '.html', '.xml')
+MIN_SIZE = 256
+FAR_FUTURE = 365 * 24 * 60 * 60
+
+# Имя с хешем содержимого (style.1a2b3c4d5e6f.css) можно кешировать навсегда
+_HASHED = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и заранее сжатыми копиями (.gz и, если есть brotli, .br)"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed.append(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for name in dict.fromkeys(hashed):
+            if name.endswith(COMPRESSIBLE):
+                self._compress(name)
+
+    def _compress(self, name):
+        with self.open(name) as source:
+            content = source.read()
+        if len(content) < MIN_SIZE:
+            return
+
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                with open(self.path(name + suffix), 'wb') as target:
+                    target.write(compressed)
+
+
+def _accepted(request):
+    header = request.headers.get('Accept-Encoding', '')
+    encodings = {part.split(';')[0].strip() for part in header.split(',')}
+    return [
+        (suffix, encoding)
+        for suffix, encoding in (('.br', 'br'), ('.gz', 'gzip'))
+        if encoding in encodings
+    ]
+
+
+def serve(request, path):
+    """Отдать файл из STATIC_ROOT (если статику не раздает веб-сервер)
+
+    Хешированные имена кешируются на год, сжатая копия выбирается по Accept-Encoding.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    file_path, encoding = full_path, None
+    for suffix, name in _accepted(request):
+        if os.path.isfile(full_path + suffix):
+            file_path, encoding = full_path + suffix, name
+            break
+
+    # Тип - по исходному имени, а не по .gz/.br
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    patch_vary_headers(response, ['Accept-Encoding'])
+
+    if _HASHED.search(path):
+        response.headers['Cache-Control'] = f'public, max-age={FAR_FUTURE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
@@ -1,3 +1,383 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import archive, autocomplete, bitmaps, blobstore, pagecache, purge, revisions, rollups
+from .cloning import clone_course
+from .content import render_markdown
+from . import progress as progress_store
+from .models import (
+    Blob, Category, Course, CourseDailyStats, CourseRecommendation, LeaderboardEntry, Lesson, LessonRevision,
+    Progress, ProgressArchive, Watermark
+)
+
+
+class FixtureMixin:
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass')
+        self.learner = User.objects.create_user('learner', password='pass')
+        self.category = Category.objects.create(name='Программирование')
+        self.course = Course.objects.create(
+            author=self.author, category=self.category, name='Курс', description='Описание'
+        )
+
+    def make_lesson(self, order, course=None, **kwargs):
+        return Lesson.objects.create(
+            course=course or self.course,
+            title=f'Урок {order}',
+            description='Описание',
+            content=kwargs.pop('content', f'Текст урока {order}'),
+            order=order,
+            **kwargs
+        )
+
+    def complete(self, lesson):
+        self.client.force_login(self.learner)
+        self.client.post(f'/lesson/{lesson.id}/complete/', {'completed': '1'})
+
+
+class BitmapTests(TestCase):
+
+    def test_round_trip(self):
+        for slots in ([], [0], [7], [8], [0, 1, 2, 63, 64, 1000]):
+            bitmap = bitmaps.from_slots(slots)
+            self.assertEqual(bitmaps.to_slots(bitmap), slots)
+            self.assertEqual(bitmaps.popcount(bitmap), len(slots))
+            self.assertEqual(bitmaps.from_int(bitmaps.to_int(bitmap)), bitmap)
+
+    def test_set_slot_and_mask(self):
+        bitmap = bitmaps.set_slot(b'', 9)
+        self.assertTrue(bitmaps.has(bitmap, 9))
+        self.assertFalse(bitmaps.has(bitmap, 8))
+        bitmap = bitmaps.set_slot(bitmap, 3)
+        self.assertEqual(bitmaps.popcount(bitmap, bitmaps.from_slots([3])), 1)
+        # Снятый старший бит не оставляет пустых байтов
+        self.assertEqual(bitmaps.set_slot(bitmaps.set_slot(b'', 20), 20, False), b'')
+        self.assertEqual(bitmaps.to_slots(bitmaps.union(bitmap, bitmaps.from_slots([1]))), [1, 3, 9])
+
+
+class RenderTests(TestCase):
+
+    def test_nested_inline_markup(self):
+        html = render_markdown('См. [функцию `len`](https://example.com/len) и **`x` [тут](/a)**')
+        self.assertNotIn('\x00', html)
+        self.assertEqual(
+            html,
+            '<p>См. <a href="https://example.com/len" rel="nofollow noopener" target="_blank">'
+            'функцию <code>len</code></a> и <strong><code>x</code> '
+            '<a href="/a" rel="nofollow noopener" target="_blank">тут</a></strong></p>'
+        )
+
+
+class SlotReuseTests(FixtureMixin, TestCase):
+
+    def purge_lesson(self, lesson):
+        purge.run_job(purge.soft_delete_lesson(lesson, self.author))
+
+    def assert_not_completed(self, lesson):
+        self.assertFalse(progress_store.is_completed(self.learner, lesson))
+        self.assertNotIn(lesson.id, progress_store.completed_lesson_ids(self.learner, self.course))
+        self.assertEqual(progress_store.completed_counts(self.learner).get(self.course.id, 0), 0)
+
+    def test_purged_slot_reused_without_progress(self):
+        self.make_lesson(1)
+        second = self.make_lesson(2)
+        self.complete(second)
+
+        self.purge_lesson(second)
+        third = self.make_lesson(2)
+        self.assertEqual(third.slot, second.slot)
+
+        self.assert_not_completed(third)
+        with override_settings(PROGRESS_BITMAPS=True):
+            self.assert_not_completed(third)
+
+    def test_purge_clears_archived_slot(self):
+        first = self.make_lesson(1)
+        second = self.make_lesson(2)
+        self.complete(first)
+        self.complete(second)
+        now = timezone.now()
+        archive.archive_pair(self.learner.id, self.course.id, now, now)
+
+        self.purge_lesson(second)
+        third = self.make_lesson(2)
+
+        stored = ProgressArchive.objects.get(user=self.learner, course=self.course)
+        self.assertEqual(stored.completed_count, 1)
+        self.assertFalse(progress_store.is_completed(self.learner, third))
+        self.assertEqual(progress_store.completed_counts(self.learner), {self.course.id: 1})
+        # Архивное завершение удаленного урока снято и с рейтингов
+        self.assertEqual(
+            LeaderboardEntry.objects.get(user=self.learner, course__isnull=True).lessons_completed, 1
+        )
+
+    def test_thaw_restores_archived_progress(self):
+        first = self.make_lesson(1)
+        self.make_lesson(2)
+        self.complete(first)
+        now = timezone.now()
+        archive.archive_pair(self.learner.id, self.course.id, now, now)
+        self.assertFalse(Progress.objects.filter(user=self.learner).exists())
+
+        expanded = list(progress_store.expand_archive(ProgressArchive.objects.all(), 'user_id'))
+        self.assertEqual(expanded, [(first.id, self.learner.id)])
+
+        self.assertTrue(progress_store.thaw(self.learner, self.course.id))
+        self.assertEqual(
+            list(Progress.objects.filter(user=self.learner).values_list('lesson_id', 'completed')),
+            [(first.id, True)]
+        )
+        self.assertFalse(ProgressArchive.objects.exists())
+
+
+class RollupTests(FixtureMixin, TestCase):
+
+    def test_started_day_keeps_history(self):
+        lesson = self.make_lesson(1)
+        self.complete(lesson)
+        now = timezone.now()
+        started = now - timedelta(days=3)
+        Progress.objects.filter(lesson=lesson).update(started_at=started, updated_at=started)
+        rollups.refresh_rollups(backfill=True)
+        day = timezone.localdate(started)
+        before = CourseDailyStats.objects.get(course=self.course, date=day)
+        self.assertEqual((before.new_learners, before.completions, before.active_users), (1, 1, 1))
+
+        # Урок снова тронут сегодня: день начала не теряет завершение и активность
+        Watermark.objects.filter(name=rollups.WATERMARK_NAME).update(value=now)
+        Progress.objects.filter(lesson=lesson).update(updated_at=now + timedelta(seconds=1))
+        rollups.refresh_rollups()
+        after = CourseDailyStats.objects.get(course=self.course, date=day)
+        self.assertEqual((after.new_learners, after.completions, after.active_users), (1, 1, 1))
+
+
+class ProgressSyncTests(FixtureMixin, TestCase):
+
+    def sync(self, lesson, completed, timestamp):
+        self.client.force_login(self.learner)
+        return self.client.post(
+            '/api/progress/sync/',
+            json.dumps({'items': [{
+                'lesson_id': lesson.id, 'completed': completed, 'client_timestamp': timestamp.isoformat()
+            }]}),
+            content_type='application/json'
+        )
+
+    def test_future_timestamp_clamped(self):
+        lesson = self.make_lesson(1)
+        self.assertEqual(self.sync(lesson, True, timezone.now() + timedelta(days=365)).status_code, 200)
+        progress = Progress.objects.get(user=self.learner, lesson=lesson)
+        self.assertLessEqual(progress.changed_at, timezone.now())
+
+        # Более позднее изменение с другого устройства не проигрывает конфликт
+        self.sync(lesson, False, timezone.now() + timedelta(seconds=1))
+        self.assertFalse(Progress.objects.get(user=self.learner, lesson=lesson).completed)
+
+
+@override_settings(STORAGES={
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class LessonSectionTests(FixtureMixin, TestCase):
+
+    def test_section_url_versioned(self):
+        paragraph = 'Абзац текста. ' * 200
+        lesson = self.make_lesson(1, content='\n\n'.join(f'## Часть {n}\n\n{paragraph}' for n in range(20)))
+        page = self.client.get(f'/lesson/{lesson.id}/')
+        src = page.context['section_version']
+        url = f'/lesson/{lesson.id}/section/1/'
+        self.assertContains(page, f'{url}?v={src}')
+
+        self.assertIn('immutable', self.client.get(f'{url}?v={src}')['Cache-Control'])
+        self.assertIn('no-cache', self.client.get(url)['Cache-Control'])
+
+        lesson.content += '\n\nНовый абзац'
+        lesson.save()
+        self.assertNotEqual(self.client.get(f'/lesson/{lesson.id}/').context['section_version'], src)
+        self.assertIn('no-cache', self.client.get(f'{url}?v={src}')['Cache-Control'])
+
+
+class AutocompleteTests(FixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        for n in range(30):
+            lesson = self.make_lesson(n + 1)
+            lesson.title = f'Питон шаг {n}'
+            lesson.save()
+        autocomplete.build()
+
+    def titles(self, query):
+        with self.assertNumQueries(0):
+            return [s.title for s in autocomplete.suggest(query)]
+
+    @mock.patch.object(autocomplete, 'SCAN_LIMIT', 5)
+    def test_update_in_place(self):
+        autocomplete.build()
+        index = autocomplete.get_index()
+        self.assertTrue(index.top)
+        Course.objects.create(author=self.author, category=self.category, name='Питон для всех', description='')
+        self.assertIs(autocomplete.get_index(), index)
+        self.assertIn('Питон для всех', self.titles('для вс'))
+
+        lesson = Lesson.objects.get(title='Питон шаг 3')
+        autocomplete.update('lesson', lesson.id)
+        self.assertNotIn('Питон шаг 3', self.titles('питон шаг'))
+
+        # Поправленный индекс отвечает так же, как построенный заново
+        fresh = autocomplete.PrefixIndex(autocomplete.load_suggestions(), index.version)
+        fresh.by_id.pop(('lesson', lesson.id))
+        fresh = autocomplete.PrefixIndex(fresh.by_id.values(), index.version)
+        for query in ('п', 'пи', 'питон шаг 1', 'шаг', 'для'):
+            self.assertEqual(index.search(query, 20), fresh.search(query, 20))
+
+    def test_other_worker_replays_changes(self):
+        stale = autocomplete.PrefixIndex(autocomplete.load_suggestions(), autocomplete.get_index().version)
+        Course.objects.create(author=self.author, category=self.category, name='Алгоритмы', description='')
+
+        with mock.patch.object(autocomplete, '_index', stale):
+            self.assertEqual(self.titles('алго'), ['Алгоритмы'])
+
+    def test_gap_rebuilds_in_background(self):
+        stale = autocomplete.PrefixIndex(autocomplete.load_suggestions(), autocomplete.get_index().version)
+        Course.objects.create(author=self.author, category=self.category, name='Алгоритмы', description='')
+        cache.delete(autocomplete.CHANGE_KEY % autocomplete._current_version())
+
+        with mock.patch.object(autocomplete, '_index', stale), \
+                mock.patch.object(autocomplete, '_refresh_in_background') as refresh:
+            # Пока строится новый индекс, отвечает старый
+            self.assertEqual(self.titles('алго'), [])
+            refresh.assert_called_once()
+
+
+class BlobTests(FixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def ref_count(self):
+        return Blob.objects.get().ref_count
+
+    def test_ref_counts_across_clone_and_purge(self):
+        first = self.make_lesson(1, file=ContentFile(b'one file', name='notes.txt'))
+        self.make_lesson(2, file=ContentFile(b'one file', name='copy.txt'))
+        self.assertTrue(blobstore.is_blob(first.file.name))
+        self.assertEqual(self.ref_count(), 2)
+
+        copy = clone_course(self.course, self.author)
+        self.assertEqual(self.ref_count(), 4)
+
+        purge.run_job(purge.soft_delete_course(self.course, self.author))
+        self.assertEqual(self.ref_count(), 2)
+        self.assertEqual(blobstore.recount(), 0)
+
+        purge.run_job(purge.soft_delete_course(copy, self.author))
+        self.assertEqual(self.ref_count(), 0)
+        # Файл без ссылок удаляет только сборщик мусора
+        self.assertTrue(blobstore.blob_storage().exists(Blob.objects.get().name))
+
+    def test_dry_run_does_not_write(self):
+        self.make_lesson(1, file=ContentFile(b'kept', name='kept.txt'))
+        lesson = self.make_lesson(2, file=ContentFile(b'orphan', name='orphan.txt'))
+        orphan = Blob.objects.get(name=lesson.file.name)
+        # Урок удален в обход сигналов: счетчик ссылок остался прежним
+        Lesson.all_objects.filter(pk=lesson.pk).delete()
+        Blob.objects.update(last_used=timezone.now() - timedelta(days=2))
+        before = sorted(Blob.objects.values_list('name', 'ref_count', 'last_used'))
+
+        out = StringIO()
+        call_command('gc_blobs', '--dry-run', stdout=out)
+        self.assertIn('Будет исправлено счетчиков ссылок: 1', out.getvalue())
+        self.assertIn('Будет удалено файлов: 1', out.getvalue())
+        self.assertEqual(sorted(Blob.objects.values_list('name', 'ref_count', 'last_used')), before)
+        self.assertTrue(blobstore.blob_storage().exists(orphan.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('gc_blobs', stdout=StringIO())
+        self.assertFalse(Blob.objects.filter(pk=orphan.pk).exists())
+        self.assertFalse(blobstore.blob_storage().exists(orphan.name))
+
+
+class SidebarTests(FixtureMixin, TestCase):
+
+    def test_deleted_course_not_recommended(self):
+        other = Course.objects.create(
+            author=self.author, category=self.category, name='Соседний курс', description=''
+        )
+        CourseRecommendation.objects.create(course=self.course, recommended=other, rank=1, score=1)
+        self.assertIn('Соседний курс', pagecache.course_sidebar(self.course.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.soft_delete_course(other, self.author)
+        self.assertNotIn('Соседний курс', pagecache.course_sidebar(self.course.id))
+
+
+class CourseEditTests(FixtureMixin, TestCase):
+
+    def test_edit_rejects_unknown_category(self):
+        self.client.force_login(self.author)
+        response = self.client.post(f'/course/{self.course.id}/edit/', {
+            'name': 'Новое имя', 'description': 'Описание', 'category': '999'
+        })
+        self.assertRedirects(response, f'/course/{self.course.id}/edit/', fetch_redirect_response=False)
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.name, self.course.category_id), ('Курс', self.category.id))
+
+        self.client.post(f'/course/{self.course.id}/edit/', {
+            'name': 'Новое имя', 'description': 'Описание', 'category': str(self.category.id)
+        })
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.name, 'Новое имя')
+
+
+class RevisionTests(FixtureMixin, TestCase):
+
+    def test_reconstruct_across_snapshot(self):
+        def text(n):
+            return ''.join(f'строка {i}\n' for i in range(n)) + 'хвост урока\n' * 50
+
+        lesson = self.make_lesson(1, content=text(0))
+        texts = [text(0)]
+        for n in range(1, revisions.SNAPSHOT_EVERY + 5):
+            previous = lesson.content
+            lesson.content = text(n)
+            lesson.save()
+            revisions.record(lesson, self.author, previous)
+            texts.append(lesson.content)
+
+        history = list(LessonRevision.objects.filter(lesson=lesson).order_by('number'))
+        self.assertEqual(len(history), len(texts))
+        # Правки до снимка и после него: снимки только на границах цепочек
+        snapshots = [revision.number for revision in history if revision.is_snapshot]
+        self.assertEqual(snapshots, [1, 1 + revisions.SNAPSHOT_EVERY])
+        for revision, expected in zip(history, texts):
+            self.assertEqual(revisions.content_at(revision), expected)
+
+    def test_rollback_records_new_revision(self):
+        lesson = self.make_lesson(1, content='первая\n')
+        revisions.record(lesson, self.author)
+        lesson.content = 'вторая\n'
+        lesson.save()
+        revisions.record(lesson, self.author, 'первая\n')
+
+        first = LessonRevision.objects.get(lesson=lesson, number=1)
+        revision = revisions.rollback(lesson, first, self.author)
+        self.assertEqual(revision.number, 3)
+        self.assertEqual(Lesson.objects.get(pk=lesson.pk).content, 'первая\n')
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Авторизация
@@ -20,18 +20,41 @@ urlpatterns = [
     path('course/create/', views.course_create, name='course_create'),
     path('course/<int:course_id>/edit/', views.course_edit, name='course_edit'),
     path('course/<int:course_id>/delete/', views.course_delete, name='course_delete'),
+    path('course/<int:course_id>/clone/', views.course_clone, name='course_clone'),
+    path('course/<int:course_id>/export/', views.course_progress_export, name='course_progress_export'),
+    path('course/<int:course_id>/stats/', views.course_stats, name='course_stats'),
+    path('course/<int:course_id>/leaderboard/', views.leaderboard, name='course_leaderboard'),
+    path('course/<int:course_id>/events/', views.course_events, name='course_events'),
     
     # Уроки
     path('lesson/<int:lesson_id>/', views.lesson_detail, name='lesson_detail'),
+    path('lesson/<int:lesson_id>/section/<int:position>/', views.lesson_section, name='lesson_section'),
     path('course/<int:course_id>/lesson/create/', views.lesson_create, name='lesson_create'),
     path('lesson/<int:lesson_id>/edit/', views.lesson_edit, name='lesson_edit'),
     path('lesson/<int:lesson_id>/delete/', views.lesson_delete, name='lesson_delete'),
+    path('lesson/<int:lesson_id>/history/', views.lesson_history, name='lesson_history'),
+    path('lesson/<int:lesson_id>/history/<int:number>/', views.lesson_revision, name='lesson_revision'),
+    path('lesson/<int:lesson_id>/history/<int:number>/rollback/', views.lesson_rollback, name='lesson_rollback'),
     path('lesson/<int:lesson_id>/complete/', views.lesson_complete, name='lesson_complete'),
     
     # Комментарии
     path('course/<int:course_id>/comment/', views.comment_create, name='comment_create'),
     path('comment/<int:comment_id>/delete/', views.comment_delete, name='comment_delete'),
     
+    # API для мобильных клиентов
+    path('api/progress/sync/', api.progress_sync, name='api_progress_sync'),
+    path('api/suggest/', api.suggest, name='api_suggest'),
+    path('api/courses/', api.api_courses, name='api_courses'),
+    path('api/courses/<int:course_id>/', api.api_course, name='api_course'),
+    path('api/courses/<int:course_id>/lessons/', api.api_course_lessons, name='api_course_lessons'),
+    path('api/courses/<int:course_id>/comments/', api.api_course_comments, name='api_course_comments'),
+    path('api/lessons/<int:lesson_id>/', api.api_lesson, name='api_lesson'),
+    path('api/lessons/<int:lesson_id>/content/', api.api_lesson_content, name='api_lesson_content'),
+    path('api/progress/', api.api_progress, name='api_progress'),
+    
+    # Рейтинг
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    
     # Категории
     path('categories/', views.category_list, name='category_list'),
     
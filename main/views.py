@@ -3,9 +3,23 @@ from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import etag, require_POST
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Category, Course, Lesson, Comment, Progress, UserProfile
+from django.utils import timezone
+from datetime import timedelta
+from .models import Course, Lesson, LessonRevision, LessonSection, Comment, Progress, UserProfile, CourseDailyStats, LessonDailyStats
+from .content import RENDERER_VERSION
+from .export import iter_progress_csv
+from . import events, leaderboards, pagecache, purge, revisions
+from . import progress as progress_store
+from .categories import get_registry
+from .cloning import clone_course
+from .ratelimit import rate_limit
 
 
 
@@ -26,7 +40,7 @@ def index(request):
 def course_list(request):
     """Список всех курсов с фильтрацией"""
     courses = Course.objects.all()
-    categories = Category.objects.all()
+    categories = get_registry()
     
     selected_category = request.GET.get('category')
     if selected_category:
@@ -51,21 +65,16 @@ def course_list(request):
 def course_detail(request, course_id):
     """Страница курса"""
     course = get_object_or_404(Course, id=course_id)
-    lessons = course.lessons.all().order_by('order')
-    comments = course.comments.all().order_by('-created_at')
+    lessons = pagecache.course_outline(course.id)
+    comments = course.comments.select_related('author').order_by('-created_at')
     
     completed_lessons = []
     progress_percent = 0
     
     if request.user.is_authenticated:
-        completed = Progress.objects.filter(
-            user=request.user,
-            lesson__course=course,
-            completed=True
-        ).values_list('lesson_id', flat=True)
-        completed_lessons = list(completed)
+        completed_lessons = progress_store.completed_lesson_ids(request.user, course, lessons)
         
-        total_lessons = lessons.count()
+        total_lessons = len(lessons)
         if total_lessons > 0:
             progress_percent = int((len(completed_lessons) / total_lessons) * 100)
     
@@ -73,6 +82,9 @@ def course_detail(request, course_id):
         'course': course,
         'lessons': lessons,
         'comments': comments,
+        'counters': pagecache.course_counters(course.id),
+        'sidebar': mark_safe(pagecache.course_sidebar(course.id)),
+        'my_rank': leaderboards.rank(request.user, course.id),
         'completed_lessons': completed_lessons,
         'progress_percent': progress_percent,
     }
@@ -91,6 +103,10 @@ def course_create(request):
             messages.error(request, 'Заполните все поля!')
             return redirect('course_create')
         
+        if not category_id.isdigit() or int(category_id) not in get_registry():
+            messages.error(request, 'Выберите категорию из списка!')
+            return redirect('course_create')
+        
         course = Course.objects.create(
             author=request.user,
             name=name,
@@ -101,8 +117,7 @@ def course_create(request):
         messages.success(request, 'Курс успешно создан!')
         return redirect('course_detail', course_id=course.id)
     
-    categories = Category.objects.all()
-    return render(request, 'main/course_form.html', {'categories': categories})
+    return render(request, 'main/course_form.html', {'categories': get_registry()})
 
 
 @login_required
@@ -115,18 +130,29 @@ def course_edit(request, course_id):
         return redirect('course_detail', course_id=course.id)
     
     if request.method == 'POST':
-        course.name = request.POST.get('name')
-        course.description = request.POST.get('description')
-        course.category_id = request.POST.get('category')
+        name = request.POST.get('name')
+        description = request.POST.get('description')
+        category_id = request.POST.get('category')
+        
+        if not name or not description or not category_id:
+            messages.error(request, 'Заполните все поля!')
+            return redirect('course_edit', course_id=course.id)
+        
+        if not category_id.isdigit() or int(category_id) not in get_registry():
+            messages.error(request, 'Выберите категорию из списка!')
+            return redirect('course_edit', course_id=course.id)
+        
+        course.name = name
+        course.description = description
+        course.category_id = category_id
         course.save()
         
         messages.success(request, 'Курс обновлен!')
         return redirect('course_detail', course_id=course.id)
     
-    categories = Category.objects.all()
     context = {
         'course': course,
-        'categories': categories,
+        'categories': get_registry(),
     }
     return render(request, 'main/course_form.html', context)
 
@@ -141,35 +167,116 @@ def course_delete(request, course_id):
         return redirect('course_detail', course_id=course.id)
     
     if request.method == 'POST':
-        course.delete()
-        messages.success(request, 'Курс удален!')
+        # Большой курс удаляется в фоне, здесь он только скрывается
+        purge.soft_delete_course(course, request.user)
+        messages.success(request, 'Курс удален! Данные курса будут очищены в фоне.')
         return redirect('course_list')
     
     return render(request, 'main/course_delete_confirm.html', {'course': course})
 
 
+@login_required
+@require_POST
+def course_clone(request, course_id):
+    """Копия курса со всеми уроками (например, на новый семестр)"""
+    course = get_object_or_404(Course, id=course_id)
+    
+    if course.author != request.user:
+        messages.error(request, 'У вас нет прав для копирования этого курса!')
+        return redirect('course_detail', course_id=course.id)
+    
+    copy = clone_course(course, request.user)
+    messages.success(request, f'Курс скопирован: {copy.name}')
+    return redirect('course_edit', course_id=copy.id)
+
+
+@login_required
+def course_progress_export(request, course_id):
+    """Выгрузка прогресса учеников курса в CSV (потоком)"""
+    course = get_object_or_404(Course, id=course_id)
+
+    if course.author != request.user:
+        messages.error(request, 'У вас нет прав для выгрузки прогресса этого курса!')
+        return redirect('course_detail', course_id=course.id)
+
+    response = StreamingHttpResponse(
+        iter_progress_csv(course.id),
+        content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="course_{course.id}_progress.csv"'
+    return response
+
+
+@login_required
+def course_stats(request, course_id):
+    """Статистика курса для автора (только из предрассчитанных таблиц)"""
+    course = get_object_or_404(Course, id=course_id)
+
+    if course.author != request.user:
+        messages.error(request, 'У вас нет прав для просмотра статистики этого курса!')
+        return redirect('course_detail', course_id=course.id)
+
+    try:
+        days = min(int(request.GET.get('days', 30)), 365)
+    except ValueError:
+        days = 30
+    since = timezone.now().date() - timedelta(days=days - 1)
+
+    daily = list(CourseDailyStats.objects.filter(course=course, date__gte=since).order_by('-date'))
+    totals = {
+        'new_learners': sum(d.new_learners for d in daily),
+        'completions': sum(d.completions for d in daily),
+        'comments': sum(d.comments for d in daily),
+    }
+
+    lesson_stats = (
+        LessonDailyStats.objects
+        .filter(course=course, date__gte=since)
+        .values('lesson_id', 'lesson_order', 'lesson_title')
+        .annotate(completions=Sum('completions'))
+        .order_by('lesson_order')
+    )
+
+    context = {
+        'course': course,
+        'days': days,
+        'daily': daily,
+        'totals': totals,
+        'lesson_stats': lesson_stats,
+    }
+    return render(request, 'main/course_stats.html', context)
+
+
 def lesson_detail(request, lesson_id):
-    """Страница урока"""
-    lesson = get_object_or_404(Lesson, id=lesson_id)
+    """Страница урока (первый раздел и оглавление, остальные разделы подгружаются)"""
+    lesson = get_object_or_404(
+        Lesson.objects.select_related('course').defer('content', 'content_html'),
+        id=lesson_id
+    )
     course = lesson.course
     
-    all_lessons = course.lessons.all().order_by('order')
+    # Урок со старой версией рендера перерисовывается один раз (вместе с разделами)
+    if lesson.renderer_version != RENDERER_VERSION:
+        lesson.rendered_content
+    
+    sections = list(lesson.sections.values_list('position', 'title'))
+    first_section = lesson.sections.filter(position=0).values_list('html', flat=True).first()
     
-    current_index = list(all_lessons).index(lesson)
-    prev_lesson = all_lessons[current_index - 1] if current_index > 0 else None
-    next_lesson = all_lessons[current_index + 1] if current_index < len(all_lessons) - 1 else None
+    outline = pagecache.course_outline(course.id)
+    position = next((i for i, item in enumerate(outline) if item.id == lesson.id), None)
+    prev_lesson = outline[position - 1] if position else None
+    next_lesson = outline[position + 1] if position is not None and position + 1 < len(outline) else None
     
     is_completed = False
     if request.user.is_authenticated:
-        is_completed = Progress.objects.filter(
-            user=request.user,
-            lesson=lesson,
-            completed=True
-        ).exists()
+        is_completed = progress_store.is_completed(request.user, lesson)
     
     context = {
         'lesson': lesson,
         'course': course,
+        'sections': sections,
+        'first_section': mark_safe(first_section or ''),
+        'section_version': _section_version(lesson.content_hash),
         'prev_lesson': prev_lesson,
         'next_lesson': next_lesson,
         'is_completed': is_completed,
@@ -177,6 +284,37 @@ def lesson_detail(request, lesson_id):
     return render(request, 'main/lesson_detail.html', context)
 
 
+SECTION_MAX_AGE = 365 * 24 * 3600
+
+
+def _section_version(content_hash):
+    """Версия разделов урока для URL: меняется с текстом и с версией рендера"""
+    return f'{content_hash[:16]}-{RENDERER_VERSION}'
+
+
+def _section_etag(request, lesson_id, position):
+    content = Lesson.objects.filter(id=lesson_id).values_list('content_hash', flat=True).first()
+    return f'{content}-{RENDERER_VERSION}-{position}' if content else None
+
+
+@etag(_section_etag)
+def lesson_section(request, lesson_id, position):
+    """Раздел урока (HTML-фрагмент для подгрузки)"""
+    section = get_object_or_404(
+        LessonSection.objects.select_related('lesson').only('html', 'lesson', 'lesson__content_hash'),
+        lesson_id=lesson_id,
+        position=position
+    )
+    response = HttpResponse(section.html)
+    if request.GET.get('v') == _section_version(section.lesson.content_hash):
+        # URL с текущей версией не меняет содержимое - кешируется надолго
+        patch_cache_control(response, public=True, max_age=SECTION_MAX_AGE, immutable=True)
+    else:
+        # Без версии (или со старой) - только с проверкой ETag
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
 @login_required
 def lesson_create(request, course_id):
     """Создание урока"""
@@ -201,11 +339,13 @@ def lesson_create(request, course_id):
             order=order,
             file=file
         )
+        revisions.record(lesson, request.user)
         
         messages.success(request, 'Урок создан!')
         return redirect('course_detail', course_id=course.id)
     
-    next_order = course.lessons.count() + 1
+    last_order = Lesson.all_objects.filter(course=course).aggregate(m=Max('order'))['m']
+    next_order = (last_order or 0) + 1
     
     context = {
         'course': course,
@@ -227,7 +367,7 @@ def lesson_delete(request, lesson_id):
         return redirect('lesson_detail', lesson_id=lesson.id)
     
     if request.method == 'POST':
-        lesson.delete()
+        purge.soft_delete_lesson(lesson, request.user)
         messages.success(request, 'Урок удален!')
         return redirect('course_detail', course_id=course.id)
     
@@ -244,6 +384,7 @@ def lesson_edit(request, lesson_id):
         return redirect('lesson_detail', lesson_id=lesson.id)
 
     if request.method == 'POST':
+        previous = lesson.content
         lesson.title = request.POST.get('title')
         lesson.description = request.POST.get('description')
         lesson.content = request.POST.get('content')
@@ -253,6 +394,7 @@ def lesson_edit(request, lesson_id):
             lesson.file = request.FILES['file']
 
         lesson.save()
+        revisions.record(lesson, request.user, previous)
 
         messages.success(request, 'Урок обновлен!')
         return redirect('lesson_detail', lesson_id=lesson.id)
@@ -263,27 +405,139 @@ def lesson_edit(request, lesson_id):
     }
     return render(request, 'main/lesson_form.html', context)
 
+
 @login_required
+def lesson_history(request, lesson_id):
+    """История версий текста урока"""
+    lesson = get_object_or_404(Lesson.objects.select_related('course'), id=lesson_id)
+
+    if lesson.course.author != request.user:
+        messages.error(request, 'У вас нет прав для просмотра истории этого урока!')
+        return redirect('lesson_detail', lesson_id=lesson.id)
+
+    context = {
+        'lesson': lesson,
+        'course': lesson.course,
+        'revisions': lesson.revisions.select_related('author').defer('data').order_by('-number'),
+    }
+    return render(request, 'main/lesson_history.html', context)
+
+
+@login_required
+def lesson_revision(request, lesson_id, number):
+    """Изменения версии относительно предыдущей (или ?against=<номер>)"""
+    lesson = get_object_or_404(Lesson.objects.select_related('course'), id=lesson_id)
+
+    if lesson.course.author != request.user:
+        messages.error(request, 'У вас нет прав для просмотра истории этого урока!')
+        return redirect('lesson_detail', lesson_id=lesson.id)
+
+    revision = get_object_or_404(LessonRevision.objects.select_related('author'), lesson=lesson, number=number)
+    try:
+        against_number = int(request.GET.get('against', number - 1))
+    except ValueError:
+        against_number = number - 1
+    against = LessonRevision.objects.filter(lesson=lesson, number=against_number).first()
+
+    context = {
+        'lesson': lesson,
+        'course': lesson.course,
+        'revision': revision,
+        'against': against,
+        'diff': revisions.diff(revisions.content_at(against) if against else '', revisions.content_at(revision)),
+        'is_current': revision.content_hash == lesson.content_hash,
+    }
+    return render(request, 'main/lesson_revision.html', context)
+
+
+@login_required
+@require_POST
+def lesson_rollback(request, lesson_id, number):
+    """Вернуть текст урока к версии"""
+    lesson = get_object_or_404(Lesson.objects.select_related('course'), id=lesson_id)
+
+    if lesson.course.author != request.user:
+        messages.error(request, 'У вас нет прав для редактирования этого урока!')
+        return redirect('lesson_detail', lesson_id=lesson.id)
+
+    revision = get_object_or_404(LessonRevision, lesson=lesson, number=number)
+    if revisions.rollback(lesson, revision, request.user) is None:
+        messages.info(request, f'Текст урока уже совпадает с версией {number}')
+    else:
+        messages.success(request, f'Урок возвращен к версии {number}')
+    return redirect('lesson_detail', lesson_id=lesson.id)
+
+@login_required
+@rate_limit('complete', methods=None)
 def lesson_complete(request, lesson_id):
     """Отметить урок как завершенный"""
     lesson = get_object_or_404(Lesson, id=lesson_id)
     
-    progress, created = Progress.objects.get_or_create(
-        user=request.user,
-        lesson=lesson
-    )
+    # Архивный прогресс возвращается в Progress, чтобы переключение видело реальное состояние
+    progress_store.thaw(request.user, lesson.course_id)
     
-    if progress.completed:
-        progress.completed = False
-        messages.info(request, 'Урок отмечен как не завершенный')
+    progress = Progress.objects.filter(user=request.user, lesson=lesson).first()
+    current = progress is not None and progress.completed
+    
+    # Форма передает нужное состояние, поэтому повторная отправка (двойной клик)
+    # ничего не пишет. Без него - переключение, но повторное переключение той же
+    # строки в течение COALESCE_SECONDS склеивается с первым
+    requested = request.POST.get('completed')
+    if requested in ('0', '1'):
+        completed = requested == '1'
+    elif progress_store.claim_toggle(request.user.pk, lesson.id):
+        completed = not current
     else:
+        completed = current
+    
+    if completed == current:
+        return redirect('lesson_detail', lesson_id=lesson.id)
+    
+    if progress is None:
+        progress = Progress(user=request.user, lesson=lesson)
+    progress.changed_at = timezone.now()
+    
+    if completed:
         progress.mark_completed()
         messages.success(request, 'Урок завершен! 🎉')
+    else:
+        progress.completed = False
+        progress.save()
+        messages.info(request, 'Урок отмечен как не завершенный')
+    
+    progress_store.update_bitmaps(request.user, [(lesson.course_id, lesson.slot, progress.completed)])
+    leaderboards.record_completion(request.user, lesson, progress.completed)
+    events.publish_progress(
+        request.user,
+        lesson.course_id,
+        {lesson.id: progress.completed},
+        progress_store.completed_counts(request.user).get(lesson.course_id, 0)
+    )
     
     return redirect('lesson_detail', lesson_id=lesson.id)
 
 
+async def course_events(request, course_id):
+    """Живые обновления страницы курса (SSE): новые комментарии и свой прогресс"""
+    # Под WSGI бесконечный поток занял бы поток сервера навсегда
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Обновления доступны только под ASGI-сервером', status=501, content_type='text/plain; charset=utf-8')
+    if not await Course.objects.filter(id=course_id).aexists():
+        raise Http404
+    
+    channels = [events.course_channel(course_id)]
+    user = await request.auser()
+    if user.is_authenticated:
+        channels.append(events.progress_channel(user.pk, course_id))
+    
+    response = StreamingHttpResponse(events.stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
+@rate_limit('comment')
 def comment_create(request, course_id):
     """Создание комментария"""
     if request.method == 'POST':
@@ -309,6 +563,7 @@ def comment_delete(request, comment_id):
     if comment.author == request.user:
         course_id = comment.course.id
         comment.delete()
+        pagecache.invalidate_course(course_id)
         messages.success(request, 'Комментарий удален!')
         return redirect('course_detail', course_id=course_id)
     
@@ -316,11 +571,34 @@ def comment_delete(request, comment_id):
     return redirect('course_detail', course_id=comment.course.id)
 
 
+def leaderboard(request, course_id=None):
+    """Рейтинг учеников: общий или по курсу"""
+    course = None
+    if course_id is not None:
+        course = get_object_or_404(Course, id=course_id)
+
+    kind = request.GET.get('kind', leaderboards.SCORE)
+    if course is None or kind not in (leaderboards.SCORE, leaderboards.FASTEST):
+        kind = leaderboards.SCORE
+
+    context = {
+        'course': course,
+        'kind': kind,
+        'page_obj': leaderboards.top(course_id, kind, page=request.GET.get('page')),
+        'my_rank': leaderboards.rank(request.user, course_id, kind),
+    }
+    return render(request, 'main/leaderboard.html', context)
+
+
 def category_list(request):
     """Список категорий"""
-    categories = Category.objects.annotate(
-        course_count=Count('courses')
+    counts = dict(
+        Course.objects.values_list('category_id').annotate(n=Count('id')).order_by()
     )
+    categories = [
+        {'id': category.id, 'name': category.name, 'course_count': counts.get(category.id, 0)}
+        for category in get_registry()
+    ]
     
     context = {
         'categories': categories,
@@ -337,50 +615,34 @@ def profile(request, username):
     # Созданные курсы
     created_courses = Course.objects.filter(author=profile_user)
     
-    # Курсы в процессе - где есть хотя бы один завершенный урок, но не все
-    completed_lesson_ids = Progress.objects.filter(
-        user=profile_user,
-        completed=True
-    ).values_list('lesson__course_id', flat=True).distinct()
-    
-    in_progress_courses = []
-    for course_id in completed_lesson_ids:
-        course = Course.objects.get(id=course_id)
-        total = course.lessons.count()
-        completed = Progress.objects.filter(
-            user=profile_user,
-            lesson__course=course,
-            completed=True
-        ).count()
-        
-        # Если не все уроки завершены - курс в процессе
-        if completed < total:
-            course.progress_percent = int((completed / total) * 100) if total > 0 else 0
-            in_progress_courses.append(course)
+    # Завершенные уроки по курсам (и из Progress, и из архива)
+    completed_counts = progress_store.completed_counts(profile_user)
+    totals = dict(
+        Lesson.objects.filter(course_id__in=completed_counts)
+        .values_list('course_id').annotate(n=Count('id')).order_by()
+    )
     
+    # Курсы в процессе - где есть хотя бы один завершенный урок, но не все
     # Завершенные курсы - где ВСЕ уроки завершены
+    in_progress_courses = []
     completed_courses = []
-    for course_id in completed_lesson_ids:
-        course = Course.objects.get(id=course_id)
-        total = course.lessons.count()
-        completed = Progress.objects.filter(
-            user=profile_user,
-            lesson__course=course,
-            completed=True
-        ).count()
+    for course in Course.objects.filter(id__in=[c for c, n in completed_counts.items() if n]):
+        total = totals.get(course.id, 0)
+        completed = completed_counts[course.id]
         
-        # Если все уроки завершены
-        if total > 0 and completed == total:
+        if total > 0 and completed >= total:
             completed_courses.append(course)
+        else:
+            course.progress_percent = int((completed / total) * 100) if total > 0 else 0
+            in_progress_courses.append(course)
     
     # Общий прогресс
-    total_progress = Progress.objects.filter(
-        user=profile_user,
-        completed=True
-    ).count()
+    total_progress = sum(completed_counts.values())
     
     context = {
         'profile_user': profile_user,
+        'global_rank': leaderboards.rank(profile_user),
+        'deletion_jobs': profile_user.deletion_jobs.all()[:5] if request.user == profile_user else [],
         'created_courses': created_courses,
         'created_courses_count': created_courses.count(),
         'in_progress_courses': in_progress_courses,
@@ -413,6 +675,7 @@ def profile_edit(request):
     return render(request, 'main/profile_edit.html', context)
 
 
+@rate_limit('auth')
 def register(request):
     """Регистрация пользователя"""
     if request.user.is_authenticated:
@@ -432,6 +695,7 @@ def register(request):
     return render(request, 'main/register.html', {'form': form})
 
 
+@rate_limit('auth')
 def user_login(request):
     """Вход пользователя"""
     if request.user.is_authenticated:
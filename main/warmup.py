@@ -0,0 +1,55 @@
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from . import autocomplete
+
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+
+
+def template_names():
+    """Шаблоны приложения: main/*.html и переопределения admin/*.html"""
+    return sorted(
+        path.relative_to(TEMPLATE_DIR).as_posix()
+        for pattern in ('main/*.html', 'admin/*.html')
+        for path in TEMPLATE_DIR.glob(pattern)
+    )
+
+
+def compile_templates():
+    """Скомпилировать шаблоны в кеш cached.Loader. Возвращает их число"""
+    names = template_names()
+    for name in names:
+        get_template(name)
+    return len(names)
+
+
+def warm_urls():
+    """Импортировать urlconf и представления и заполнить таблицы reverse()"""
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for namespace in resolver.namespace_dict:
+        resolver.namespace_dict[namespace][1].reverse_dict
+    return len(resolver.reverse_dict)
+
+
+def warm_up():
+    """Прогрев воркера при старте: {этап: мс}"""
+    timings = {}
+    steps = (('templates', compile_templates), ('urls', warm_urls), ('autocomplete', autocomplete.build))
+    for name, step in steps:
+        started = time.perf_counter()
+        step()
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    if getattr(settings, 'WARM_CACHE_ON_STARTUP', False):
+        # Кеш популярных курсов - в фоне, чтобы не задерживать старт воркера.
+        # Воркеры, стартующие одновременно, не дублируют работу: single-flight
+        from .pagecache import warm_popular_courses
+        threading.Thread(target=warm_popular_courses, daemon=True).start()
+    return timings